@@ -0,0 +1,213 @@
+"""
+ * Backup store of project revisions
+ *    Content is split into chunks on line boundaries chosen by content,
+ *    so an edit changes only chunks around it. Each chunk is stored once
+ *    zlib compressed under its sha256, revision is a list of chunk hashes.
+ *
+ *    <project>_backups/index.json  - list of revisions
+ *    <project>_backups/chunks/xx/  - chunk files
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+
+import os, json, zlib, hashlib, time
+import ProjectFile
+
+
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 256 * 1024
+CHUNK_BOUNDARY_MASK = 0x3ff  # line ends a chunk when crc32(line) & mask == 0
+
+
+def backupDirName(projectFileName):
+    fileDirName = os.path.dirname(projectFileName)
+    if fileDirName:
+        fileDirName += '/'
+    projectName = ProjectFile.projectBaseName(os.path.basename(projectFileName))
+    return "%s%s_backups" % (fileDirName, projectName)
+
+
+def splitChunks(content):
+    chunks = []
+    chunk = []
+    chunkSize = 0
+    for line in content.split(b'\n'):
+        line += b'\n'
+        # binary content may have too long lines
+        while len(line) > CHUNK_MAX_SIZE:
+            chunks.append(b''.join(chunk) + line[:CHUNK_MAX_SIZE - chunkSize])
+            line = line[CHUNK_MAX_SIZE - chunkSize:]
+            chunk = []
+            chunkSize = 0
+
+        chunk.append(line)
+        chunkSize += len(line)
+        if chunkSize < CHUNK_MIN_SIZE:
+            continue
+        if (chunkSize < CHUNK_MAX_SIZE and
+            zlib.crc32(line) & CHUNK_BOUNDARY_MASK):
+            continue
+        chunks.append(b''.join(chunk))
+        chunk = []
+        chunkSize = 0
+
+    if chunk:
+        chunks.append(b''.join(chunk))
+    # content has no line end after last line
+    chunks[-1] = chunks[-1][:-1]
+    if not chunks[-1]:
+        chunks.pop()
+    return chunks
+
+
+class BackupStore():
+
+
+    def __init__(self, dirName):
+        self._dirName = dirName
+        self._indexFileName = "%s/index.json" % dirName
+        self._revisions = None
+
+
+    def revisions(self):
+        if self._revisions is not None:
+            return self._revisions
+
+        self._revisions = []
+        if os.path.isfile(self._indexFileName):
+            with open(self._indexFileName, 'r') as file:
+                self._revisions = json.loads(file.read())
+        return self._revisions
+
+
+    def revision(self, id):
+        for revision in self.revisions():
+            if revision['id'] == id:
+                return revision
+        return None
+
+
+    def addRevision(self, content, extension='.es', projectRevision=None):
+        hashes = []
+        newSize = 0
+        for chunk in splitChunks(content):
+            hash = hashlib.sha256(chunk).hexdigest()
+            hashes.append(hash)
+            fileName = self.chunkFileName(hash)
+            if os.path.isfile(fileName):
+                continue
+            if not os.path.isdir(os.path.dirname(fileName)):
+                os.makedirs(os.path.dirname(fileName))
+            data = zlib.compress(chunk)
+            newSize += len(data)
+            ProjectFile.writeFileAtomic(fileName, data)
+
+        revisions = self.revisions()
+        id = 1
+        if revisions:
+            id = revisions[-1]['id'] + 1
+        revision = {'id': id,
+                    'time': int(time.time()),
+                    'rev': projectRevision,
+                    'extension': extension,
+                    'size': len(content),
+                    'chunks': hashes}
+        revisions.append(revision)
+        self.saveIndex()
+        print("backup revision %d: %d chunks, %d bytes written" % (id,
+                                                                  len(hashes),
+                                                                  newSize))
+        return revision
+
+
+    def chunkFileName(self, hash):
+        return "%s/chunks/%s/%s" % (self._dirName, hash[:2], hash)
+
+
+    def content(self, id):
+        revision = self.revision(id)
+        if not revision:
+            raise KeyError("backup revision %d not found" % id)
+
+        parts = []
+        for hash in revision['chunks']:
+            with open(self.chunkFileName(hash), 'rb') as file:
+                parts.append(zlib.decompress(file.read()))
+        return b''.join(parts)
+
+
+    def restore(self, id, fileName):
+        # restored revision is always written as '.es' text project
+        content = self.content(id)
+        if content[:len(ProjectFile.BINARY_MAGIC)] == ProjectFile.BINARY_MAGIC:
+            project = ProjectFile.decodeProject(content)
+            content = ProjectFile.encodeProject(project)
+        ProjectFile.writeFileAtomic(fileName, content)
+
+
+    def applyRetention(self, keepAllInterval, keepDays, now=None):
+        # keep all revisions of keepAllInterval seconds,
+        # one revision per day for keepDays days before
+        if now is None:
+            now = int(time.time())
+        keptDays = []
+        revisions = []
+        for revision in reversed(self.revisions()):
+            age = now - revision['time']
+            if age < keepAllInterval:
+                revisions.insert(0, revision)
+                continue
+            day = time.strftime("%Y-%m-%d", time.localtime(revision['time']))
+            if age >= keepDays * 24 * 60 * 60 or day in keptDays:
+                continue
+            keptDays.append(day)
+            revisions.insert(0, revision)
+
+        removedCount = len(self.revisions()) - len(revisions)
+        if not removedCount:
+            return 0
+
+        self._revisions = revisions
+        self.saveIndex()
+        self.removeUnusedChunks()
+        return removedCount
+
+
+    def removeUnusedChunks(self):
+        usedHashes = set()
+        for revision in self.revisions():
+            usedHashes.update(revision['chunks'])
+
+        chunksDir = "%s/chunks" % self._dirName
+        if not os.path.isdir(chunksDir):
+            return
+        for subDir in os.listdir(chunksDir):
+            for hash in os.listdir("%s/%s" % (chunksDir, subDir)):
+                if hash not in usedHashes:
+                    os.remove("%s/%s/%s" % (chunksDir, subDir, hash))
+
+
+    def saveIndex(self):
+        if not os.path.isdir(self._dirName):
+            os.makedirs(self._dirName)
+        content = json.dumps(self.revisions(), indent=1).encode('utf-8')
+        ProjectFile.writeFileAtomic(self._indexFileName, content)
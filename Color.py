@@ -24,10 +24,12 @@
 
 from PyQt5.QtGui import *
 from PyQt5.Qt import QPoint
+import threading
 
 
 class Color (QColor):
     usedColorsList = []
+    usedColorsLock = threading.Lock()  # colors are created by thumbnail rendering thread too
     def __init__(self, arg1, arg2=None, arg3=None, arg4=None):
         argType = arg1.__class__.__name__
         if argType == 'QColor':
@@ -46,36 +48,35 @@ class Color (QColor):
 
     @staticmethod
     def storeColor(color):
-        exist = False
-        for row in Color.usedColorsList:
-            existColor = row['color']
-            if existColor == color:
-                exist = True
-                break
-        if exist:
-            row['cnt'] += 1
-            return
-        Color.usedColorsList.append({'color': color,
-                                     'cnt': 1})
+        with Color.usedColorsLock:
+            for row in Color.usedColorsList:
+                if row['color'] == color:
+                    row['cnt'] += 1
+                    return
+            Color.usedColorsList.append({'color': color,
+                                         'cnt': 1})
 
 
     @staticmethod
     def usedColorsPrint():
-        for row in Color.usedColorsList:
-            print("%s - %d" % (row['color'], row['cnt']))
+        with Color.usedColorsLock:
+            for row in Color.usedColorsList:
+                print("%s - %d" % (row['color'], row['cnt']))
 
 
     @staticmethod
     def usedColors():
         colors = []
-        for row in Color.usedColorsList:
-            colors.append(row['color'])
+        with Color.usedColorsLock:
+            for row in Color.usedColorsList:
+                colors.append(row['color'])
         return colors
 
 
     @staticmethod
     def resetColorHistory():
-        Color.usedColorsList = []
+        with Color.usedColorsLock:
+            Color.usedColorsList = []
 
 
     def __eq__(self, other):
@@ -91,11 +92,12 @@ class Color (QColor):
 
 
     def remove(self):
-        for row in Color.usedColorsList:
-            if row['color'] == self:
-                row['cnt'] -= 1
-                if not row['cnt']:
-                    Color.usedColorsList.remove(row)
+        with Color.usedColorsLock:
+            for row in Color.usedColorsList:
+                if row['color'] == self:
+                    row['cnt'] -= 1
+                    if not row['cnt']:
+                        Color.usedColorsList.remove(row)
                     return
 
 
@@ -0,0 +1,144 @@
+"""
+ * Library component references in saved projects
+ *    Placed library component is saved as a reference: group properties
+ *    without 'graphicsObjects' plus overrides of child properties which
+ *    differ from the library template. Templates of referenced components
+ *    are saved once into project 'components' section, so project file
+ *    stays self-contained. Component with other children count or with
+ *    removed child properties is saved with embedded geometry.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+PROJECT_VERSION = 1  # project file without references
+REFERENCES_VERSION = 2  # project file with 'components' section
+
+def _clone(value):
+    # faster than copy.deepcopy() for plain JSON data
+    if type(value) is dict:
+        return {key: _clone(item) for (key, item) in value.items()}
+    if type(value) is list:
+        return [_clone(item) for item in value]
+    return value
+
+
+def isReference(properties):
+    return 'component' in properties and 'graphicsObjects' not in properties
+
+
+def makeReference(properties, template):
+    children = properties['graphicsObjects']
+    templateChildren = template['graphicsObjects']
+    if len(children) != len(templateChildren):
+        return None
+
+    overrides = {}
+    for i in range(len(children)):
+        child = children[i]
+        templateChild = templateChildren[i]
+        if child == templateChild:
+            continue
+        for key in templateChild:
+            if key not in child:
+                return None
+
+        childOverrides = {}
+        for key in child:
+            if key not in templateChild or child[key] != templateChild[key]:
+                childOverrides[key] = child[key]
+        overrides[str(i)] = childOverrides
+
+    reference = dict(properties)
+    del reference['graphicsObjects']
+    if overrides:
+        reference['overrides'] = overrides
+    return reference
+
+
+def expandReference(reference, template):
+    properties = dict(reference)
+    overrides = properties.pop('overrides', {})
+    children = []
+    for i in range(len(template['graphicsObjects'])):
+        child = _clone(template['graphicsObjects'][i])
+        if str(i) in overrides:
+            child.update(overrides[str(i)])
+        children.append(child)
+    properties['graphicsObjects'] = children
+    return properties
+
+
+def usedComponents(project, templates):
+    names = set()
+    for pageData in project['pages']:
+        for properties in pageData['items']:
+            name = properties.get('component')
+            if name in templates:
+                names.add(name)
+    return names
+
+
+def packProject(project, templates, pageFragments=None):
+    # returns copy of project with references to templates,
+    # pages with encoded fragment are not packed
+    packed = dict(project)
+    packed['pages'] = []
+    for i in range(len(project['pages'])):
+        pageData = project['pages'][i]
+        if pageFragments and pageFragments[i] is not None:
+            packed['pages'].append(pageData)
+            continue
+
+        itemsData = []
+        for properties in pageData['items']:
+            name = properties.get('component')
+            if name in templates and 'graphicsObjects' in properties:
+                reference = makeReference(properties, templates[name])
+                if reference:
+                    properties = reference
+            itemsData.append(properties)
+        packedPage = dict(pageData)
+        packedPage['items'] = itemsData
+        packed['pages'].append(packedPage)
+
+    components = {}
+    for name in usedComponents(project, templates):
+        components[name] = {'graphicsObjects': templates[name]['graphicsObjects']}
+    if components:
+        # older editors can't read references
+        packed['components'] = components
+        packed['header'] = dict(project['header'])
+        packed['header']['version'] = REFERENCES_VERSION
+    return packed
+
+
+def expandProject(project):
+    # replace references by full group properties, project is changed in place
+    templates = project.pop('components', {})
+    if not templates:
+        return
+    project['header']['version'] = PROJECT_VERSION
+    for pageData in project['pages']:
+        itemsData = pageData['items']
+        for i in range(len(itemsData)):
+            if isReference(itemsData[i]):
+                itemsData[i] = expandReference(itemsData[i],
+                                               templates[itemsData[i]['component']])
@@ -0,0 +1,148 @@
+"""
+ * Component library search
+ *    Components are indexed by trigrams and short prefixes of words of
+ *    their name, prefix name and texts. Query words with misprints match
+ *    by part of common trigrams.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import re
+from collections import Counter
+
+
+MIN_SIMILARITY = 0.5  # part of query word trigrams found in component words
+USED_BONUS = 1.0  # rank bonus of components placed in the project
+
+
+def words(text):
+    return [word for word in re.split(r'[\W_]+', text.lower()) if word]
+
+
+def trigrams(word):
+    return set(word[i:i + 3] for i in range(len(word) - 2))
+
+
+class ComponentSearch():
+
+
+    def __init__(self):
+        self._components = {}  # {name: set of words}
+        self._trigrams = {}  # {trigram: set of names}
+        self._prefixes = {}  # {one or two first letters of word: set of names}
+        self._namePrefixes = {}  # {prefix of word of component name: set of names}
+
+
+    def _indexes(self, name, nameWords, otherWords):
+        # (index, key) pairs the component is added to
+        keys = []
+        for word in nameWords:
+            for i in range(1, len(word) + 1):
+                keys.append((self._namePrefixes, word[:i]))
+        for word in nameWords | otherWords:
+            keys.append((self._prefixes, word[:1]))
+            keys.append((self._prefixes, word[:2]))
+            for trigram in trigrams(word):
+                keys.append((self._trigrams, trigram))
+        return keys
+
+
+    def setComponent(self, name, prefixName="", texts=None):
+        self.removeComponent(name)
+        nameWords = set(words(name))
+        otherWords = set(words(prefixName))
+        for text in texts or []:
+            otherWords.update(words(text))
+        self._components[name] = (nameWords, otherWords)
+        for (index, key) in self._indexes(name, nameWords, otherWords):
+            index.setdefault(key, set()).add(name)
+
+
+    def removeComponent(self, name):
+        if name not in self._components:
+            return
+        (nameWords, otherWords) = self._components.pop(name)
+        for (index, key) in self._indexes(name, nameWords, otherWords):
+            names = index.get(key)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del index[key]
+
+
+    def wordScores(self, queryWord):
+        # {name: score} of components matching one query word
+        if len(queryWord) < 3:
+            scores = dict.fromkeys(self._prefixes.get(queryWord, ()), 1.0)
+        else:
+            queryTrigrams = trigrams(queryWord)
+            if len(queryTrigrams) == 1:
+                hits = dict.fromkeys(self._trigrams.get(queryWord, ()), 1)
+            else:
+                hits = Counter()
+                for trigram in queryTrigrams:
+                    hits.update(self._trigrams.get(trigram, ()))
+            minHits = len(queryTrigrams) * MIN_SIMILARITY
+            scores = {}
+            for (name, count) in hits.items():
+                if count >= minHits:
+                    scores[name] = count / len(queryTrigrams)
+
+        # components which name starts with the query word are ranked first
+        for name in self._namePrefixes.get(queryWord, ()):
+            if name in scores:
+                scores[name] += 1.0
+        return scores
+
+
+    def search(self, query, usage=None, limit=None):
+        # returns names of matched components, best first
+        # usage: {component name: count of placements in project}
+        queryWords = words(query)
+        if not queryWords:
+            return []
+
+        scores = None
+        for queryWord in sorted(queryWords, key=len, reverse=True):
+            wordScores = self.wordScores(queryWord)
+            if scores is None:
+                scores = wordScores
+                continue
+            for name in list(scores):
+                if name in wordScores:
+                    scores[name] += wordScores[name]
+                else:
+                    del scores[name]
+            if not scores:
+                break
+
+        if not usage:
+            usage = {}
+        for name in usage:
+            if usage[name] and name in scores:
+                scores[name] += USED_BONUS
+
+        # by score, then by name
+        names = sorted(scores)
+        names.sort(key=scores.get, reverse=True)
+        if limit is not None:
+            names = names[:limit]
+        return names
@@ -0,0 +1,173 @@
+"""
+ * Placed components index of the project
+ *    Groups placed from library or having prefix name are indexed by
+ *    component name and prefix name. Instances of materialized pages are
+ *    the groups themselves, instances of not materialized pages are
+ *    PagePreparser summary entries. Index is updated while items are
+ *    added and removed from scenes, so lookups don't walk pages items.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+
+class ComponentUsage():
+    def __init__(self):
+        self.clear()
+
+
+    def clear(self):
+        # instance is {'page', 'group'} for placed group or
+        # {'page', 'data'} for summary entry of not materialized page
+        self._instances = {}  # by key: id() of group or (page, summary position)
+        self._byComponent = {}  # component name: {key: None}
+        self._byPrefix = {}  # prefix name: {key: None}
+        self._byPage = {}  # page: {key: None}
+        self._byId = {}  # top level item id: key
+
+
+    def addGroup(self, page, group):
+        # called again when component or prefix name of group is changed
+        key = id(group)
+        self.remove(key)
+        if not group.componentName() and not group.prefixName():
+            return
+        itemId = None
+        if not group.parent():
+            itemId = group.id()
+        self._add(key, {'page': page,
+                        'group': group,
+                        'component': group.componentName(),
+                        'prefixName': group.prefixName(),
+                        'itemId': itemId})
+
+
+    def removeGroup(self, group):
+        self.remove(id(group))
+
+
+    def addPage(self, page, componentsData):
+        # componentsData: 'components' of PagePreparser summary
+        for pos in range(len(componentsData)):
+            data = componentsData[pos]
+            if not data.get('component') and not data['prefixName']:
+                continue
+            itemId = None
+            if data['topLevel']:
+                itemId = data['id']
+            self._add((page, pos), {'page': page,
+                                    'data': data,
+                                    'component': data.get('component'),
+                                    'prefixName': data['prefixName'],
+                                    'itemId': itemId})
+
+
+    def removePage(self, page):
+        for key in list(self._byPage.get(page, {})):
+            self.remove(key)
+
+
+    def _add(self, key, instance):
+        self._instances[key] = instance
+        if instance['component']:
+            self._byComponent.setdefault(instance['component'], {})[key] = None
+        if instance['prefixName']:
+            self._byPrefix.setdefault(instance['prefixName'], {})[key] = None
+        self._byPage.setdefault(instance['page'], {})[key] = None
+        if instance['itemId'] is not None:
+            self._byId[instance['itemId']] = key
+
+
+    def remove(self, key):
+        instance = self._instances.pop(key, None)
+        if not instance:
+            return
+        for (index, name) in [(self._byComponent, instance['component']),
+                              (self._byPrefix, instance['prefixName']),
+                              (self._byPage, instance['page'])]:
+            if not name:
+                continue
+            keys = index[name]
+            del keys[key]
+            if not keys:
+                del index[name]
+        if self._byId.get(instance['itemId']) == key:
+            del self._byId[instance['itemId']]
+
+
+    def instances(self, component=None, prefixName=None):
+        # [{'page', 'id', 'indexName', 'group', 'topLevel', 'rootId'}, ...]
+        # in placing order, 'group' is None for not materialized pages
+        keys = {}
+        if component:
+            keys = self._byComponent.get(component, {})
+        elif prefixName:
+            keys = self._byPrefix.get(prefixName, {})
+        list = []
+        for key in keys:
+            instance = self._instances[key]
+            group = instance.get('group')
+            if group:
+                topLevel = not group.parent()
+                rootId = group.root().id()
+            else:
+                topLevel = instance['data']['topLevel']
+                rootId = instance['data']['rootId']
+            list.append({'page': instance['page'],
+                         'id': self.instanceId(instance),
+                         'indexName': self.indexName(instance),
+                         'group': group,
+                         'topLevel': topLevel,
+                         'rootId': rootId})
+        return list
+
+
+    def count(self, component):
+        return len(self._byComponent.get(component, {}))
+
+
+    def usage(self):
+        # {component name: count of placed groups}
+        usage = {}
+        for (name, keys) in self._byComponent.items():
+            usage[name] = len(keys)
+        return usage
+
+
+    def instanceId(self, instance):
+        if 'group' in instance:
+            return instance['group'].id()
+        return instance['data']['id']
+
+
+    def indexName(self, instance):
+        if 'group' in instance:
+            return instance['group'].indexName()
+
+        data = instance['data']
+        parentId = data['parentComponentId']
+        if parentId is not None and parentId in self._byId:
+            parent = self._instances[self._byId[parentId]]
+            return "%s.%d" % (self.indexName(parent), data['index'])
+        if data['prefixName']:
+            if data['index']:
+                return "%s%d" % (data['prefixName'], data['index'])
+            return "%s" % data['prefixName']
+        return ""
@@ -28,19 +28,39 @@ from NavigationHistory import *
 from Color import *
 from Settings import *
 from LineEditValidators import *
-from PyQt5.Qt import QWidget, QMainWindow, QLabel, QPoint, QTimer
+from ProjectSaver import *
+import ProjectFile
+import ProjectJournal
+import ComponentReferences
+from PagePreparser import preparsePage
+from BackupStore import *
+from LibraryIndex import *
+from ThumbnailLoader import *
+from ThumbnailRenderer import *
+from ComponentSearch import *
+from ComponentUsage import *
+from PyQt5.Qt import QWidget, QMainWindow, QLabel, QPoint, QTimer, QFileSystemWatcher
 import os, glob, sys, pprint, re
-from shutil import copyfile
 import time
 import datetime
 
 
+PROJECT_FILE_FILTER = "Electro schematic file (*.es *.esb *.es.gz *.es.xz)"
+PROJECT_SAVE_FILE_FILTER = ("Electro schematic file (*.es);;"
+                            "Electro binary schematic file (*.esb);;"
+                            "Electro gzip compressed schematic file (*.es.gz);;"
+                            "Electro xz compressed schematic file (*.es.xz)")
+THUMBNAIL_CACHE_SIZE = 300  # decoded component thumbnails kept in memory
+LIBRARY_RELOAD_DELAY = 500  # ms after last library change
+COMPONENT_SEARCH_LIMIT = 200  # components shown in search results
+
+
 def editorPath():
     return os.path.dirname(os.path.realpath(sys.argv[0]))
 
 
 class ElectroEditor(QMainWindow):
-    EDITOR_VERSION = 1
+    EDITOR_VERSION = ComponentReferences.REFERENCES_VERSION
 
     def __init__(self, app):
         QMainWindow.__init__(self)
@@ -50,7 +70,28 @@ class ElectroEditor(QMainWindow):
         self.keyShift = False
         self.pages = []
         self.componentList = []
+        self.componentsRevision = 0  # incremented on each library change
+        self.thumbnailLoader = ThumbnailLoader()
+        self.thumbnailLoader.loaded.connect(self.thumbnailLoaded)
+        self.thumbnailCache = PixmapCache(THUMBNAIL_CACHE_SIZE)
+        self.thumbnailRenderer = ThumbnailRenderer()
+        self.thumbnailRenderer.finished.connect(self.thumbnailRendered)
+        self.thumbnailComponents = {}  # components with requested or cached thumbnail
+        self.componentSearch = ComponentSearch()
+        self.componentSearchResults = None  # components shown in list while searching
+        self.componentSearchUsage = None
+        self.componentInstances = ComponentUsage()  # placed components of project
+        self.componentInstancesShown = []  # instances in component instances list
+        self.itemPages = {}  # pages of top level items by item id, ids may be duplicated
         self.connectionsList = []
+        self.pendingConnections = []  # connections with not materialized link points
+        self.journal = ProjectJournal.ProjectJournal()
+        self.journalFlushScheduled = False
+        self.journalOrder = None  # pages order in last journal record
+        self.journalConnections = {'set': {}, 'removed': []}
+        self.journalRecovered = False
+        self.changesSaving = False  # saved changes are not written by background saving yet
+        self.pageJournalKeyLast = 0
         self.projectFileName = ""
         self.projectName = ""
         self.projectRevision = 1
@@ -93,12 +134,6 @@ class ElectroEditor(QMainWindow):
         rightPanellayout = QVBoxLayout(rightPanel)
 
         self.tabWidget = QTabWidget()
-        def tabChanged(index):
-            if index < 0:
-                return
-            page = self.tabWidget.widget(index)
-            page.updateLinkPoints()
-            self.setEditorTool(page.scene().currentTool())
         rightPanellayout.addWidget(self.tabWidget)
 
         # create left panel
@@ -107,7 +142,11 @@ class ElectroEditor(QMainWindow):
         leftPanellayout = QVBoxLayout(leftPanel)
 
         # create component list
-        self.tabWidget.currentChanged.connect(tabChanged)
+        self.tabWidget.currentChanged.connect(self.tabChanged)
+        self.componentSearchEdit = QLineEdit()
+        self.componentSearchEdit.setPlaceholderText("search")
+        self.componentSearchEdit.textChanged.connect(self.searchComponents)
+        leftPanellayout.addWidget(self.componentSearchEdit)
         self.componentListWidget = QListWidget()
         leftPanellayout.addWidget(self.componentListWidget)
         def componentCliced(component):
@@ -121,14 +160,26 @@ class ElectroEditor(QMainWindow):
             self.sceneView().setFocus()
             # self.componentListWidget.setFocus(True)
         self.componentListWidget.itemClicked.connect(componentCliced)
+        scrollBar = self.componentListWidget.verticalScrollBar()
+        scrollBar.valueChanged.connect(lambda value: self.updateVisibleThumbnails())
+        scrollBar.rangeChanged.connect(lambda minimum, maximum: self.updateVisibleThumbnails())
 
         # create component properties info
         self.componentInfoLabel = QLabel()
         self.componentInfoLabel.setWordWrap(True)
         self.componentInfoLabel.setAlignment(Qt.AlignTop | Qt.AlignLeft)
-        self.componentInfoLabel.setFixedHeight(60)
+        self.componentInfoLabel.setFixedHeight(75)
         leftPanellayout.addWidget(self.componentInfoLabel)
 
+        # create placed instances list of component
+        self.componentInstancesWidget = QListWidget()
+        self.componentInstancesWidget.setFixedHeight(100)
+        leftPanellayout.addWidget(self.componentInstancesWidget)
+        def componentInstanceClicked(item):
+            row = self.componentInstancesWidget.row(item)
+            self.displayComponentInstance(self.componentInstancesShown[row])
+        self.componentInstancesWidget.itemClicked.connect(componentInstanceClicked)
+
         # make help dialog
         self.helpDialog = QWidget()
         layout = QHBoxLayout(self.helpDialog)
@@ -181,9 +232,35 @@ class ElectroEditor(QMainWindow):
         self.tabWidget.installEventFilter(self)
 
         # make components list
+        self.settings = Settings()
+        self.libraryIndex = LibraryIndex("%s/.electro_library_index" % os.getenv("HOME"))
+        self.libraries = self.componentLibraries()
         self.loadComponents()
+        self.libraryReloadTimer = QTimer()
+        self.libraryReloadTimer.setSingleShot(True)
+        self.libraryReloadTimer.timeout.connect(self.reloadComponents)
+        self.libraryWatcher = QFileSystemWatcher()
+        self.libraryWatcher.directoryChanged.connect(self.libraryChanged)
+        self.libraryWatcher.fileChanged.connect(self.libraryChanged)
+        self.watchComponents()
         self.lastBackupTime = 0
-        self.settings = Settings()
+
+        # project saving in background
+        self.projectSaver = ProjectSaver()
+        def saveProgress(fileName, percent):
+            self.showStatusBarMessage("saving project %s: %d%%" % (fileName, percent), 0)
+        def saveFinished(fileName, error):
+            if error:
+                # changes stay unsaved until next successful saving
+                print("can't save project %s: %s" % (fileName, error))
+                self.showStatusBarErrorMessage("can't save project %s: %s" % (fileName, error))
+                return
+            if not self.projectSaver.isBusy():
+                self.changesSaving = False
+                self.startJournal(fileName)
+            self.showStatusBarMessage("project saved in %s" % fileName)
+        self.projectSaver.progress.connect(saveProgress)
+        self.projectSaver.finished.connect(saveFinished)
 
         # make help message
         helpText = GraphicsItemText(mapToGrid(self.sceneView().center(),
@@ -224,7 +301,19 @@ class ElectroEditor(QMainWindow):
         self.displayScenePosition(SceneViewPosition(0, 0, 100), page.scene())
 
 
+    def tabChanged(self, index):
+        if index < 0:
+            return
+        page = self.tabWidget.widget(index)
+        self.linkPageConnections(page)
+        page.updateLinkPoints()
+        self.setEditorTool(page.scene().currentTool())
+
+
     def actualizePagesTabs(self, currentPage=None):
+        # rebuild tabs without activating each page on the way
+        self.tabWidget.blockSignals(True)
+
         # remove all tabs
         cnt = self.tabWidget.count()
         while(cnt):
@@ -242,36 +331,190 @@ class ElectroEditor(QMainWindow):
             else:
                 self.tabWidget.addTab(page, "%d" % i)
 
-        if not currentPage:
-            return
-        index = self.tabWidget.indexOf(currentPage)
-        self.tabWidget.setCurrentIndex(index)
+        if currentPage:
+            index = self.tabWidget.indexOf(currentPage)
+            self.tabWidget.setCurrentIndex(index)
+
+        self.tabWidget.blockSignals(False)
+        self.tabChanged(self.tabWidget.currentIndex())
+        self.journalSchedule()
 
 
     def switchPage(self, pageNum):
         self.tabWidget.setCurrentIndex(pageNum - 1)
 
 
+    def materializedPages(self):
+        pages = []
+        for page in self.pages:
+            if page.isMaterialized():
+                pages.append(page)
+        return pages
+
+
+    def componentLibraries(self):
+        # editable components directory is searched first
+        libraries = [DirectoryLibrary(componentsPath())]
+        for path in self.settings.data()['componentLibraries']:
+            libraries.append(openLibrary(os.path.expanduser(path)))
+        return libraries
+
+
+    def libraryByPath(self, path):
+        for library in self.libraries:
+            if library.path() == path:
+                return library
+        return None
+
+
     def loadComponents(self):
-        for fileName in glob.glob("%s/*.ec" % componentsPath()):
-            fileName = os.path.basename(fileName)
-            componentName = os.path.splitext(fileName)[0]
-            component = Component(componentName)
-            if not component.load():
-                print("error loading component %s" % componentName)
+        # names, prefixes and thumbnails are taken from library index
+        for entry in self.libraryIndex.update(self.libraries):
+            component = Component(entry['name'])
+            component.setIndexEntry(entry, self.libraryIndex.thumbnail(entry),
+                                    self.libraryByPath(entry['library']))
             self.componentList.append(component)
             self.componentListWidget.addItem(component)
+            self.indexComponent(component)
+        QTimer.singleShot(0, self.updateVisibleThumbnails)
+
+
+    def watchComponents(self):
+        # replaced files are not watched anymore, they are added again,
+        # archives are watched as a whole
+        paths = [library.path() for library in self.libraries]
+        for component in self.componentList:
+            fileName = component.fileName('.ec')
+            if fileName:
+                paths.append(fileName)
+        watched = set(self.libraryWatcher.files() + self.libraryWatcher.directories())
+        paths = [path for path in paths
+                 if path not in watched and os.path.exists(path)]
+        if paths:
+            self.libraryWatcher.addPaths(paths)
+
+
+    def libraryChanged(self, path):
+        # burst of changes is reloaded once
+        self.libraryReloadTimer.start(LIBRARY_RELOAD_DELAY)
+
+
+    def reloadComponents(self):
+        # only added, removed and changed components are updated
+        entries = {}
+        for entry in self.libraryIndex.update(self.libraries):
+            entries[entry['name']] = entry
+
+        changed = False
+        for component in list(self.componentList):
+            entry = entries.pop(component.name(), None)
+            if entry and component.indexStamp() is None:
+                # files written by editor are already loaded
+                component.setIndexStamp(entry)
+                continue
+            if entry and component.indexStamp() == (entry['library'], entry['stamp'],
+                                                     entry['pngStamp']):
+                continue
+            changed = True
+            self.thumbnailCache.remove(component.name())
+            self.thumbnailComponents.pop(component.name(), None)
+            if not entry:
+                print("library component %s was removed" % component.name())
+                self.componentListWidget.takeItem(self.componentListWidget.row(component))
+                self.componentList.remove(component)
+                self.componentSearch.removeComponent(component.name())
+                continue
+            print("library component %s was changed" % component.name())
+            component.setIndexEntry(entry, self.libraryIndex.thumbnail(entry),
+                                    self.libraryByPath(entry['library']))
+            self.indexComponent(component)
+
+        for name in sorted(entries):
+            print("library component %s was added" % name)
+            changed = True
+            component = Component(name)
+            component.setIndexEntry(entries[name], self.libraryIndex.thumbnail(entries[name]),
+                                    self.libraryByPath(entries[name]['library']))
+            self.componentList.append(component)
+            self.componentListWidget.addItem(component)
+            self.indexComponent(component)
+
+        if changed:
+            self.componentsRevision += 1
+            self.searchComponents(self.componentSearchEdit.text())
+            self.updateVisibleThumbnails()
+        self.watchComponents()
 
 
     def addComponent(self, name, group):
+        self.componentsRevision += 1
         component = Component(name, group)
         component.save()
+        self.thumbnailRenderer.render(name, "%s/%s" % (componentsPath(), name),
+                                      component.groupProperties())
         component.load()
+        self.thumbnailCache.remove(name)
         self.componentList.append(component)
         self.componentListWidget.addItem(component)
+        self.indexComponent(component)
+        self.searchComponents(self.componentSearchEdit.text())
+        self.updateVisibleThumbnails()
+
+
+    def indexComponent(self, component):
+        self.componentSearch.setComponent(component.name(),
+                                          component.prefixName(),
+                                          component.texts())
+
+
+    def componentUsage(self):
+        # {component name: count of placed groups}
+        return self.componentInstances.usage()
+
+
+    def searchComponents(self, text):
+        # list shows only results while searching, hidden rows of
+        # QListWidget make items moving slow on large libraries
+        widget = self.componentListWidget
+        searching = self.componentSearchResults is not None
+        if searching or text.strip():
+            while widget.count():
+                widget.takeItem(widget.count() - 1)
+
+        if not text.strip():
+            if searching:
+                for component in self.componentList:
+                    widget.addItem(component)
+            self.componentSearchResults = None
+            self.componentSearchUsage = None
+            self.updateVisibleThumbnails()
+            return
+
+        if not searching:
+            self.componentSearchUsage = self.componentUsage()
+
+        componentsByName = {}
+        for component in self.componentList:
+            componentsByName[component.name()] = component
+        names = self.componentSearch.search(text, self.componentSearchUsage,
+                                            COMPONENT_SEARCH_LIMIT)
+        self.componentSearchResults = []
+        for name in names:
+            if name in componentsByName:
+                self.componentSearchResults.append(componentsByName[name])
+                widget.addItem(componentsByName[name])
+        self.updateVisibleThumbnails()
 
 
     def removeComponent(self, component):
+        if not component.isEditable():
+            self.showStatusBarErrorMessage("component '%s' is in read only library %s" % (
+                                           component.name(), component.library().path()))
+            return
+        self.componentsRevision += 1
+        self.componentSearch.removeComponent(component.name())
+        self.thumbnailCache.remove(component.name())
+        self.thumbnailComponents.pop(component.name(), None)
         self.componentListWidget.takeItem(self.componentListWidget.row(component))
         self.componentList.remove(component)
         component.removeFiles()
@@ -279,6 +522,66 @@ class ElectroEditor(QMainWindow):
         self.componentListWidget.clearSelection()
 
 
+    def visibleComponents(self):
+        # rows in viewport and half of viewport below it
+        widget = self.componentListWidget
+        rect = widget.viewport().rect()
+        bottom = rect.bottom() + rect.height() / 2
+        index = widget.indexAt(rect.topLeft())
+        row = index.row() if index.isValid() else 0
+        components = []
+        while row < widget.count():
+            component = widget.item(row)
+            row += 1
+            if component.isHidden():
+                continue
+            itemRect = widget.visualItemRect(component)
+            if itemRect.bottom() < rect.top():
+                continue
+            if itemRect.top() > bottom:
+                break
+            components.append(component)
+        return components
+
+
+    def updateVisibleThumbnails(self):
+        sources = []
+        ratio = self.componentListWidget.devicePixelRatioF()
+        for component in self.visibleComponents():
+            if self.thumbnailCache.get(component.name()):
+                continue
+            if component.thumbnailSource() is None:
+                continue
+            self.thumbnailComponents[component.name()] = component
+            sources.append((component.name(), component.thumbnailSource(ratio)))
+        self.thumbnailLoader.request(sources)
+
+
+    def thumbnailRendered(self, name, error):
+        if error:
+            self.showStatusBarErrorMessage("can't render thumbnail of %s: %s" % (name, error))
+            return
+        for component in self.componentList:
+            if component.name() == name and component.isEditable():
+                component.setThumbnailFile()
+                component.setIndexStamp(None)
+                self.thumbnailCache.remove(name)
+                self.updateVisibleThumbnails()
+                return
+
+
+    def thumbnailLoaded(self, name, image):
+        component = self.thumbnailComponents.get(name)
+        if not component or image.isNull():
+            return
+        pixmap = QPixmap.fromImage(image)
+        component.setThumbnail(pixmap)
+        for evictedName in self.thumbnailCache.put(name, pixmap):
+            evicted = self.thumbnailComponents.pop(evictedName, None)
+            if evicted:
+                evicted.setThumbnail(None)
+
+
     def pageById(self, id):
         return self.tabWidget.widget(id)
 
@@ -447,14 +750,14 @@ class ElectroEditor(QMainWindow):
         # detect CTRL pressed
         if key == 16777249:  # CTRL
             self.keyCTRL = True
-            for page in self.pages:
+            for page in self.materializedPages():
                 page.scene().keyCTRLPress()
                 page.sceneView().keyCTRLPress()
 
         # detect Shift pressed
         if key == 16777248:  # Shift
             self.keyShift = True
-            for page in self.pages:
+            for page in self.materializedPages():
                 page.scene().keyShiftPress()
                 page.sceneView().keyShiftPress()
 
@@ -531,12 +834,16 @@ class ElectroEditor(QMainWindow):
             file = None
             if not self.projectFileName or self.keyShift:
                 lastDir = self.settings.data()['lastProjectDir']
-                file = str(QFileDialog.getSaveFileName(None,
+                (file, selectedFilter) = QFileDialog.getSaveFileName(None,
                                                        "Save project",
-                                            filter="Electro schematic file (*.es)",
-                                            directory=lastDir)[0])
+                                            filter=PROJECT_SAVE_FILE_FILTER,
+                                            directory=lastDir)
+                file = str(file)
                 if not file:
                     return
+                extension = re.search(r'\*(\.[\w.]+)', selectedFilter)
+                if not ProjectFile.projectExtension(file) and extension:
+                    file += extension.group(1)
             self.saveProject(file)
             return
 
@@ -544,7 +851,7 @@ class ElectroEditor(QMainWindow):
         if self.keyCTRL and key == 79:  # CTRL+O
             lastDir = self.settings.data()['lastProjectDir']
             file = str(QFileDialog.getOpenFileName(None, "open schematic",
-                                        filter="Electro schematic file (*.es)",
+                                        filter=PROJECT_FILE_FILTER,
                                         directory=lastDir)[0])
             if not file:
                 return
@@ -566,6 +873,32 @@ class ElectroEditor(QMainWindow):
                                     validator=validator)
             return
 
+        # restore project revision from backups
+        if self.keyCTRL and key == 66:  # CTRL+B
+            if not self.projectFileName:
+                return
+            store = BackupStore(backupDirName(self.projectFileName))
+            revisions = store.revisions()
+            if not len(revisions):
+                self.showStatusBarErrorMessage("project has no backups")
+                return
+
+            def dialogOnReturn(str):
+                str = str.strip()
+                if not str.isdigit():
+                    return
+                self.restoreBackupRevision(int(str))
+
+            last = revisions[-1]
+            date = time.strftime("%d.%m.%Y %H:%M", time.localtime(last['time']))
+            self.dialogLineEditShow("Restore backup revision %d..%d "
+                                    "(last one from %s):" % (revisions[0]['id'],
+                                                             last['id'],
+                                                             date),
+                                    dialogOnReturn, str(last['id']),
+                                    selectAll=True)
+            return
+
         # search item by indexName or id
         if self.keyCTRL and key == 70:  # CTRL+F
             def dialogOnReturn(str):
@@ -581,7 +914,7 @@ class ElectroEditor(QMainWindow):
                 self.resetSelectionItems()
                 item.scene().itemAddToSelection(item)
                 self.displayItem(item)
-                item.highlight()
+                item.scene().highlightItem(item)
 
             self.dialogLineEditShow("Search item. Enter indexName or itemId:",
                                     dialogOnReturn)
@@ -761,13 +1094,13 @@ class ElectroEditor(QMainWindow):
 
         if key == 16777249:  # CTRL
             self.keyCTRL = False
-            for page in self.pages:
+            for page in self.materializedPages():
                 page.scene().keyCTRLRelease()
                 page.sceneView().keyCTRLRelease()
 
         if key == 16777248:  # Shift
             self.keyShift = False
-            for page in self.pages:
+            for page in self.materializedPages():
                 page.scene().keyShiftRelease()
                 page.sceneView().keyShiftRelease()
 
@@ -783,6 +1116,7 @@ class ElectroEditor(QMainWindow):
 
         def dialogOnReturn(text):
             text = text.upper()
+            group.scene().markChanged()
             if not len(text):
                 group.setIndex(0)
                 group.setPrefixName("")
@@ -802,6 +1136,7 @@ class ElectroEditor(QMainWindow):
                 # change index between busyness and current index
                 existGroup = self.findGroupByIndexName(text, group)
                 if existGroup:
+                    existGroup.scene().markChanged()
                     existGroup.setPrefixName(group.prefixName())
                     existGroup.setIndex(group.index())
                     self.updateSubComponentsView(existGroup)
@@ -821,6 +1156,7 @@ class ElectroEditor(QMainWindow):
             # change index between busyness and current index
             existGroup = self.findGroupByIndexName(text, group)
             if existGroup:
+                existGroup.scene().markChanged()
                 existGroup.setIndex(group.index())
                 self.updateSubComponentsView(existGroup)
 
@@ -940,11 +1276,61 @@ class ElectroEditor(QMainWindow):
     def showComponentInfo(self, component=None):
         if not component:
             self.componentInfoLabel.setText("")
+            self.showComponentInstances(None)
             return
         info = "Component\n"
         info += "file: %s\n" % component.name()
         info += "prefix: %s\n" % component.prefixName()
+        info += "placed: %d\n" % self.componentInstances.count(component.name())
         self.componentInfoLabel.setText(info)
+        self.showComponentInstances(component.name())
+
+
+    def showComponentInstances(self, componentName):
+        self.componentInstancesWidget.clear()
+        self.componentInstancesShown = []
+        if not componentName:
+            return
+        instances = self.componentInstances.instances(componentName)
+        instances.sort(key=lambda instance: (instance['page'].num(),
+                                             instance['indexName']))
+        for instance in instances:
+            text = instance['indexName']
+            if not text:
+                text = "id %d" % instance['id']
+            self.componentInstancesWidget.addItem("%s  page %d" % (text, instance['page'].num()))
+        self.componentInstancesShown = instances
+
+
+    def displayComponentInstance(self, instance):
+        group = instance['group']
+        if group and not group.scene():
+            self.showStatusBarErrorMessage("Component %s was removed" % instance['indexName'])
+            return
+
+        scene = self.scene()
+        if scene:
+            scene.abortPastComponent()
+        if not group:
+            # page is materialized with new groups of its components
+            page = instance['page']
+            group = page.scene().itemById(instance['rootId'])
+            if group and not instance['topLevel']:
+                found = None
+                for subGroup in group.allSubItems(GROUP_TYPE):
+                    if (subGroup.id() == instance['id'] and
+                        subGroup.indexName() == instance['indexName']):
+                        found = subGroup
+                        break
+                group = found
+            if not group:
+                self.showStatusBarErrorMessage("Component %s is not found" % instance['indexName'])
+                return
+
+        self.resetSelectionItems()
+        group.scene().itemAddToSelection(group.root())
+        self.displayItem(group)
+        self.sceneView().setFocus()
 
 
     def showGroupInfo(self, group=None):
@@ -955,6 +1341,8 @@ class ElectroEditor(QMainWindow):
         info += "name: %s\n" % group.name()
         info += "id: %d\n" % group.id()
         info += "index: %s\n" % group.indexName()
+        if group.componentName():
+            info += "placed: %d\n" % self.componentInstances.count(group.componentName())
         self.componentInfoLabel.setText(info)
 
 
@@ -1012,6 +1400,19 @@ class ElectroEditor(QMainWindow):
 
         [prefixName, index] = res[:2]
         for page in self.pages:
+            if not page.isMaterialized():
+                for componentData in page.componentsData():
+                    if not componentData['topLevel']:
+                        continue
+                    if excludeGroup and componentData['id'] == excludeGroup.id():
+                        continue
+                    if componentData['parentComponentId'] is not None:
+                        continue
+                    if (componentData['prefixName'] == prefixName and
+                        componentData['index'] == index):
+                        return page.scene().itemById(componentData['id'])
+                continue
+
             groups = page.scene().graphicsItems(GROUP_TYPE)
             for group in groups:
                 if excludeGroup and group.id() == excludeGroup.id():
@@ -1029,6 +1430,17 @@ class ElectroEditor(QMainWindow):
         listIndexes = []
         # get index list by all components
         for page in self.pages:
+            if not page.isMaterialized():
+                for componentData in page.componentsData():
+                    if componentData['prefixName'] != prefixName:
+                        continue
+                    if (componentData['topLevel'] and
+                        componentData['parentComponentId'] is not None):
+                        continue
+                    if componentData['index']:
+                        listIndexes.append(componentData['index'])
+                continue
+
             groups = page.scene().allGraphicsItems(GROUP_TYPE)
             for group in groups:
                 if not group.prefixName():
@@ -1057,6 +1469,12 @@ class ElectroEditor(QMainWindow):
     def findFreeSubComponentIndex(self, parentComponentGroup):
         listIndexes = []
         for page in self.pages:
+            if not page.isMaterialized():
+                for componentData in page.subComponentsData(parentComponentGroup):
+                    if componentData['index']:
+                        listIndexes.append(componentData['index'])
+                continue
+
             groups = page.scene().allGraphicsItems(GROUP_TYPE)
             for group in groups:
                 if group.parentComponentGroup() != parentComponentGroup:
@@ -1080,6 +1498,8 @@ class ElectroEditor(QMainWindow):
 
 
     def setUniqueComponentIndex(self, group):
+        if group.scene():
+            group.scene().markChanged()
         parentComponentGroup = group.parentComponentGroup()
         if not parentComponentGroup:
             prefixName = group.prefixName()
@@ -1101,6 +1521,9 @@ class ElectroEditor(QMainWindow):
     def subComponentGroups(self, parentGroup):
         subComponents = []
         for page in self.pages:
+            if (not page.isMaterialized() and
+                not len(page.subComponentsData(parentGroup))):
+                continue
             subComponents += page.scene().subComponentGroups(parentGroup)
         return subComponents
 
@@ -1137,7 +1560,7 @@ class ElectroEditor(QMainWindow):
 
     def updateAllComponentsView(self):
         subComponents = []
-        for page in self.pages:
+        for page in self.materializedPages():
             groups = page.scene().allGraphicsItems(GROUP_TYPE)
             for group in groups:
                 group.updateView()
@@ -1146,6 +1569,7 @@ class ElectroEditor(QMainWindow):
     def connectionCreate(self, linkPoint1, linkPoint2):
         conn = Connection(self, linkPoint1, linkPoint2)
         self.connectionsList.append(conn)
+        self.journalConnectionAdd(conn)
 
 
     def removeConnection(self, conn):
@@ -1172,17 +1596,30 @@ class ElectroEditor(QMainWindow):
         self.resetSelectionItems()
         self.displayItem(remoteLinkPoint)
         remoteLinkPoint.scene().itemAddToSelection(remoteLinkPoint)
-        remoteLinkPoint.highlight()
+        remoteLinkPoint.scene().highlightItem(remoteLinkPoint)
         return True
 
 
     def itemById(self, id):
-        for page in self.pages:
-            scene = page.scene()
-            item = scene.itemById(id)
-            if item:
-                return item
-        return None
+        pages = self.itemPages.get(id)
+        if not pages:
+            return None
+        return pages[0].scene().itemById(id)
+
+
+    def setItemPage(self, id, page):
+        pages = self.itemPages.setdefault(id, [])
+        if page not in pages:
+            pages.append(page)
+
+
+    def removeItemPage(self, id, page):
+        pages = self.itemPages.get(id)
+        if not pages or page not in pages:
+            return
+        pages.remove(page)
+        if not pages:
+            del self.itemPages[id]
 
 
     def graphicsObjectFromJson(self, jsonText):
@@ -1216,7 +1653,44 @@ class ElectroEditor(QMainWindow):
         return newItems
 
 
+    def connectionCreateByProperties(self, connData):
+        linkPoint1 = self.itemById(connData['p1'])
+        linkPoint2 = self.itemById(connData['p2'])
+        if not linkPoint1 or not linkPoint2:
+            print("can't find LinkPoints for connection %d" % connData['id'])
+            return None
+        conn = Connection(self, linkPoint1, linkPoint2)
+        conn.setId(connData['id'])
+        self.connectionsList.append(conn)
+        return conn
+
+
+    def linkPageConnections(self, page):
+        page.materialize()
+        if not len(self.pendingConnections):
+            return
+
+        linkPointsIds = []
+        for linkPoint in page.scene().graphicsItems(LINK_TYPE):
+            linkPointsIds.append(linkPoint.id())
+
+        for connData in list(self.pendingConnections):
+            if (not connData['p1'] in linkPointsIds and
+                not connData['p2'] in linkPointsIds):
+                continue
+            self.pendingConnections.remove(connData)
+            Connection.releaseId(connData['id'])
+            self.connectionCreateByProperties(connData)
+
+
     def connectionByLinkPoint(self, linkPoint):
+        for connData in self.pendingConnections:
+            if linkPoint.id() == connData['p1'] or linkPoint.id() == connData['p2']:
+                self.pendingConnections.remove(connData)
+                Connection.releaseId(connData['id'])
+                self.connectionCreateByProperties(connData)
+                break
+
         for conn in self.connectionsList:
             for point in conn.linkPoints():
                 if point.id() == linkPoint.id():
@@ -1226,21 +1700,21 @@ class ElectroEditor(QMainWindow):
 
     def selectedGraphicsItems(self, type=None):
         items = []
-        for page in self.pages:
+        for page in self.materializedPages():
             scene = page.scene()
             items += scene.selectedGraphicsItems(type)
         return items
 
 
     def resetSelectionItems(self):
-        for page in self.pages:
+        for page in self.materializedPages():
             scene = page.scene()
             scene.resetSelectionItems()
 
 
     def itemsAddToSelection(self, items):
         for item in items:
-            for page in self.pages:
+            for page in self.materializedPages():
                 scene = page.scene()
                 if scene != item.scene():
                     continue
@@ -1256,7 +1730,7 @@ class ElectroEditor(QMainWindow):
 
     def saveProject(self, newfileName):
         if newfileName:
-            if newfileName[-3:] != '.es':
+            if not ProjectFile.projectExtension(newfileName):
                 newfileName += '.es'
             fileDirName = os.path.dirname(newfileName)
             if not os.path.isdir(fileDirName):
@@ -1269,8 +1743,11 @@ class ElectroEditor(QMainWindow):
 
         fileDirName = os.path.dirname(self.projectFileName)
         self.settings.set('lastProjectDir', fileDirName)
-        self.saveProjectToFile(self.projectFileName)
-        self.showStatusBarMessage("project saved in %s" % self.projectFileName)
+        changed = self.isSchematicChanged()
+        if not self.saveProjectToFile(self.projectFileName):
+            return
+        # edits made while writing are tracked by history again
+        self.changesSaving = changed
         self.resetSchematicChanged()
 
 
@@ -1279,14 +1756,14 @@ class ElectroEditor(QMainWindow):
         if not self.currectPage():
             return False
 
-        self.backupProject()
+        backup = self.backupRequest()
         if self.isSchematicChanged():
             self.projectRevision += 1
             self._schematicDate = datetime.date.today()
 
         scenePos = self.sceneView().scenePos()
         header = {"app": "Electro Schematic editor",
-                  "version": self.EDITOR_VERSION,
+                  "version": ComponentReferences.PROJECT_VERSION,
                   "viewPage": self.currectPage().num(),
                   "viewCenter": {'x': scenePos.pos().x(),
                                  'y': scenePos.pos().y()},
@@ -1294,58 +1771,88 @@ class ElectroEditor(QMainWindow):
                   "rev": self.projectRevision,
                   "date": self.schematicDate()}
 
+        # only changed pages are collected and encoded again
         pagesData = []
+        pagesCache = []
         for page in self.pages:
-            itemsData = []
-            items = page.scene().graphicsItems()
-            for item in items:
-                itemsData.append(item.properties())
-            pagesData.append({"num": page.num(),
-                              "name": page.name(),
-                              "items": itemsData})
+            cache = page.serializationCache()
+            pagesData.append(cache['data'])
+            pagesCache.append(cache)
 
         connections = []
         for connection in self.connectionsList:
             connections.append(connection.properties())
+        connections += self.pendingConnections
 
         data = {"header": header,
                 "pages": pagesData,
                 "connections": connections}
-        jsonText = json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
 
-        file = open(fileName, "w")
-        file.write(jsonText)
-        file.close()
+        # journal records written before this point are included into file
+        self.flushJournal()
+        self.journal.markSaved(self.pagesJournalKeys())
+
+        # encoding and writing are done in background
+        self.showStatusBarMessage("saving project %s" % fileName, 0)
+        self.projectSaver.save(fileName, data, backup, pagesCache,
+                               self.componentTemplates(data))
         return True
 
 
-    def backupProject(self):
-        if not self.projectFileName:
-            return
+    def componentTemplates(self, project):
+        # library components which placed groups are saved as references to,
+        # only components placed in project are parsed
+        if not self.settings.data()['componentReferences']:
+            return None
+        names = set()
+        for pageData in project['pages']:
+            for properties in pageData['items']:
+                if 'component' in properties:
+                    names.add(properties['component'])
+        templates = {}
+        for component in self.componentList:
+            if component.name() not in names:
+                continue
+            properties = component.groupProperties()
+            if properties:
+                templates[component.name()] = properties
+        return templates
 
-        if not os.path.isfile(self.projectFileName):
-            return
+
+    def backupRequest(self):
+        if not self.projectFileName:
+            return None
 
         cuttentTime = int(time.time())
-        backupInterval = self.settings.data()['backupInterval']
-        if cuttentTime < (self.lastBackupTime + backupInterval):
-            return
+        settings = self.settings.data()
+        if cuttentTime < (self.lastBackupTime + settings['backupInterval']):
+            return None
 
         self.lastBackupTime = cuttentTime
-        baseFileName = os.path.basename(self.projectFileName)
+        return {'dirName': backupDirName(self.projectFileName),
+                'keepAllInterval': settings['backupKeepAllInterval'],
+                'keepDays': settings['backupKeepDays']}
+
+
+    def restoreBackupRevision(self, id):
+        store = BackupStore(backupDirName(self.projectFileName))
+        revision = store.revision(id)
+        if not revision:
+            self.showStatusBarErrorMessage("backup revision %d not found" % id)
+            return
+
         fileDirName = os.path.dirname(self.projectFileName)
         if fileDirName:
             fileDirName += '/'
-        projectName = os.path.splitext(baseFileName)[0]
-        date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-        newFileDir = "%s%s_backups" % (fileDirName, projectName)
-        if not os.path.isdir(newFileDir):
-            os.mkdir(newFileDir)
-        newFileName = "%s/%s_%s.es" % (newFileDir,
-                                       projectName,
-                                       date)
-        print("makeBackup to %s" % newFileName)
-        copyfile(self.projectFileName, newFileName)
+        projectName = ProjectFile.projectBaseName(os.path.basename(self.projectFileName))
+        fileName = "%s%s_backup%d.es" % (fileDirName, projectName, id)
+        try:
+            store.restore(id, fileName)
+        except (OSError, ValueError) as e:
+            print("can't restore backup revision %d: %s" % (id, e))
+            self.showStatusBarErrorMessage("can't restore backup revision %d: %s" % (id, e))
+            return
+        self.showStatusBarMessage("backup revision %d restored into %s" % (id, fileName))
 
 
     def openProject(self, fileName):
@@ -1353,15 +1860,11 @@ class ElectroEditor(QMainWindow):
 
         self.navigationHistory.reset()
 
-        file = open(fileName, "r")
-        fileContent = file.read()
-        file.close()
-
         try:
-            project = json.loads(str(fileContent))
+            project = ProjectFile.loadProject(fileName)
         except:
-            print("Incorrect file data: can't parse JSON")
-            self.showStatusBarErrorMessage("Incorrect file data: can't parse JSON")
+            print("Incorrect file data: can't parse project file")
+            self.showStatusBarErrorMessage("Incorrect file data: can't parse project file")
             return
 
         if not 'header' in project:
@@ -1381,58 +1884,85 @@ class ElectroEditor(QMainWindow):
 
         self.resetEditor()
 
-        header = project['header']
-        pagesData = project['pages']
-        connectionsData = project['connections']
-
-        if header['version'] > self.EDITOR_VERSION:
+        if project['header']['version'] > self.EDITOR_VERSION:
             print("incompatible versions")
             self.showStatusBarErrorMessage("incompatible versions")
             return
 
-        # create pages
-        listUpdateParentComponents = []
+        try:
+            ComponentReferences.expandProject(project)
+        except (KeyError, TypeError) as e:
+            print("can't expand component references: %s" % e)
+            self.showStatusBarErrorMessage("can't expand component references: %s" % e)
+            return
+
+        # replay edits which were not saved before crash
+        journal = ProjectJournal.loadJournal(fileName)
+        pageKeys = None
+        if journal:
+            (journalHeader, journalRecords) = journal
+            try:
+                pageKeys = ProjectJournal.applyJournal(project,
+                                                       journalHeader,
+                                                       journalRecords)
+                self.pageJournalKeyLast = ProjectJournal.lastPageKey(journalHeader,
+                                                                     journalRecords)
+            except (ValueError, KeyError, TypeError) as e:
+                print("can't replay journal: %s" % e)
+                journal = None
+                project = ProjectFile.loadProject(fileName)
+
+        header = project['header']
+        pagesData = project['pages']
+        connectionsData = project['connections']
+
+        # create pages, graphics items are created while page first displayed
+        invalidCount = 0
         for pageData in pagesData:
-            page = PageWidget(self)
+            summary = preparsePage(pageData['items'])
+            for (pos, error) in summary['invalid']:
+                print("page %d: skip invalid item %s: %s" % (pageData['num'],
+                                                             pageData['items'][pos].get('id'),
+                                                             error))
+            invalidCount += len(summary['invalid'])
+
+            page = PageWidget(self, pageData['items'], summary)
             page.setName(pageData['name'])
             page.setNum(pageData['num'])
             self.pages.append(page)
-            itemsData = pageData['items']
-            scene = page.scene()
-
-            for itemProp in itemsData:
-                item = createGraphicsObjectByProperties(itemProp, True)
-                if not item:
-                    continue
-
-                if item.type() == GROUP_TYPE and 'parentComponentId' in itemProp:
-                    listUpdateParentComponents.append((item,
-                                                       itemProp['parentComponentId']))
-                scene.addGraphicsItem(item)
-            scene.update()
-
-        # actualize parent to sub components
-        for (group, parentId) in listUpdateParentComponents:
-            parentGroup = self.itemById(parentId)
-            group.setParentComponentGroup(parentGroup)
-
-        # actualize connections
+            with GraphicsItem.idLock:
+                if summary['lastId'] > GraphicsItem.lastId:
+                    GraphicsItem.lastId = summary['lastId']
+        if invalidCount:
+            self.showStatusBarErrorMessage("%d invalid items were skipped" % invalidCount)
+        if pageKeys:
+            for (page, key) in zip(self.pages, pageKeys):
+                page.setJournalKey(key)
+
+        # connections are created while both link points are materialized
         connLastId = 0
         for connData in connectionsData:
-            linkPoint1 = self.itemById(connData['p1'])
-            linkPoint2 = self.itemById(connData['p2'])
-            conn = Connection(self, linkPoint1, linkPoint2)
-            conn._id = connData['id']
-            if conn.id() > connLastId:
-                connLastId = conn.id()
-            self.connectionsList.append(conn)
+            Connection.reserveId(connData['id'])
+            if connData['id'] > connLastId:
+                connLastId = connData['id']
+            self.pendingConnections.append(connData)
         Connection.lastId = connLastId + 1
         self.projectFileName = fileName
         self.projectName = os.path.basename(fileName)
 
-        self.actualizePagesTabs()
+        viewPage = None
+        if 'viewPage' in header and 0 < header['viewPage'] <= len(self.pages):
+            viewPage = self.pages[header['viewPage'] - 1]
+        self.actualizePagesTabs(viewPage)
+        if journal:
+            self.journalRecovered = True
+            self.showStatusBarMessage("unsaved changes were recovered from %s" %
+                                      ProjectJournal.journalFileName(fileName), 10)
+        if not journal:
+            # opened file is the saved state of current pages
+            self.journal.markSaved(self.pagesJournalKeys())
+        self.startJournal(fileName, journal)
         if 'viewPage' in header:
-            self.switchPage(header['viewPage'])
             self.displayScenePosition(SceneViewPosition(int(header['viewCenter']['x']),
                                                     int(header['viewCenter']['y']),
                                                     int(header['viewZoom'])))
@@ -1507,6 +2037,19 @@ class ElectroEditor(QMainWindow):
 
 
     def resetEditor(self):
+        # edits of dropped project are not journaled anymore
+        self.journal.discard()
+        self.journalOrder = None
+        self.journalConnections = {'set': {}, 'removed': []}
+        self.journalRecovered = False
+        self.changesSaving = False
+
+        # not materialized pages have nothing to remove from scene
+        self.pages = self.materializedPages()
+        for connData in self.pendingConnections:
+            Connection.releaseId(connData['id'])
+        self.pendingConnections = []
+
         pagesCopy = []
         for page in self.pages:
             pagesCopy.append(page)
@@ -1514,6 +2057,8 @@ class ElectroEditor(QMainWindow):
         for page in pagesCopy:
             page.remove()
         self.pages = []
+        self.componentInstances.clear()
+        self.itemPages = {}
         self.connectionsList = []
         self.actualizePagesTabs()
         GraphicsItem.lastId = 0
@@ -1523,10 +2068,19 @@ class ElectroEditor(QMainWindow):
         self._schematicDate = datetime.date.today()
 
 
+    def closeEvent(self, event):
+        # let background saving finish writing
+        self.projectSaver.wait()
+        self.thumbnailRenderer.wait()
+        self.thumbnailLoader.stop()
+        self.journal.discard()
+        QMainWindow.closeEvent(self, event)
+
+
     def focusOutEvent(self, event):
         self.keyCTRL = False
 #        self.keyShift = False
-        for page in self.pages:
+        for page in self.materializedPages():
             scene = page.scene()
             view = page.sceneView()
             scene.keyShiftRelease()
@@ -1545,7 +2099,9 @@ class ElectroEditor(QMainWindow):
 
 
     def isSchematicChanged(self):
-        for page in self.pages:
+        if self.journalRecovered or self.changesSaving:
+            return True
+        for page in self.materializedPages():
             scene = page.scene()
             history = scene.history
             if history.historyChanged:
@@ -1553,11 +2109,104 @@ class ElectroEditor(QMainWindow):
         return False
 
     def resetSchematicChanged(self):
-        for page in self.pages:
+        self.journalRecovered = False
+        for page in self.materializedPages():
             scene = page.scene()
             history = scene.history
             history.historyChanged = False
 
+    def newPageJournalKey(self):
+        self.pageJournalKeyLast += 1
+        return self.pageJournalKeyLast
+
+
+    def pagesJournalKeys(self):
+        keys = []
+        for page in self.pages:
+            keys.append(page.journalKey())
+        return keys
+
+
+    def pagesJournalOrder(self):
+        order = []
+        for page in self.pages:
+            order.append([page.journalKey(), page.name()])
+        return order
+
+
+    def startJournal(self, fileName, journal=None):
+        self.flushJournal()
+        self.journalOrder = self.pagesJournalOrder()
+        try:
+            if journal:
+                (header, records) = journal
+                self.journal.resume(fileName, header, records)
+                return
+            self.journal.restart(fileName)
+        except OSError as e:
+            print("can't start journal: %s" % e)
+            self.showStatusBarErrorMessage("can't start journal: %s" % e)
+
+
+    def journalSchedule(self):
+        if not self.journal.isOpen() or self.journalFlushScheduled:
+            return
+        self.journalFlushScheduled = True
+        QTimer.singleShot(0, self.flushJournal)
+
+
+    def journalConnectionAdd(self, conn):
+        if not self.journal.isOpen():
+            return
+        self.journalConnections['set'][conn.id()] = conn.properties()
+        self.journalSchedule()
+
+
+    def journalConnectionRemove(self, conn):
+        if not self.journal.isOpen():
+            return
+        self.journalConnections['set'].pop(conn.id(), None)
+        self.journalConnections['removed'].append(conn.id())
+        self.journalSchedule()
+
+
+    def flushJournal(self):
+        # write edits of finished user action as one journal record
+        self.journalFlushScheduled = False
+        if not self.journal.isOpen():
+            return
+
+        record = {}
+        order = self.pagesJournalOrder()
+        if order != self.journalOrder:
+            record['order'] = order
+            self.journalOrder = order
+
+        pagesDelta = []
+        for page in self.materializedPages():
+            delta = page.scene().takeJournalDelta()
+            if not delta:
+                continue
+            delta['page'] = page.journalKey()
+            pagesDelta.append(delta)
+        if pagesDelta:
+            record['pages'] = pagesDelta
+
+        connections = self.journalConnections
+        if connections['set'] or connections['removed']:
+            record['connections'] = {'set': list(connections['set'].values()),
+                                     'removed': connections['removed']}
+            self.journalConnections = {'set': {}, 'removed': []}
+
+        if not record:
+            return
+        try:
+            self.journal.append(record)
+        except OSError as e:
+            print("can't write journal: %s" % e)
+            self.showStatusBarErrorMessage("can't write journal: %s" % e)
+
+
     def schematicDate(self):
         d = self._schematicDate
         if not d:
@@ -1572,42 +2221,186 @@ def componentsPath():
 
 
 class PageWidget(QWidget):
-    def __init__(self, editor):
+    def __init__(self, editor, itemsData=None, summary=None):
         QWidget.__init__(self)
         global page_last_id
-        scene = ElectroScene(editor)
-        self._sceneView = ElectroSceneView(editor, scene)
+        self._sceneView = None
+        self._num = 0
+        self._name = ""
+        self._itemsData = itemsData  # items properties of not materialized page
+        self._summary = summary  # PagePreparser summary of itemsData
+        self._invalidItemsData = []  # items which can't be created, saved back as is
+        self._serializationCache = None
+        self._journalKey = editor.newPageJournalKey()
         layout = QVBoxLayout(self)
-        layout.addWidget(self._sceneView)
         self.editor = editor
         self.setLayout(layout)
+        if itemsData is None:
+            self.materialize()
+            return
+        editor.componentInstances.addPage(self, self.componentsData())
+        for id in self.summary()['ids']:
+            editor.setItemPage(id, self)
+
+
+    def isMaterialized(self):
+        return self._sceneView is not None
+
+
+    def materialize(self):
+        if self.isMaterialized():
+            return
+
+        editor = self.editor
+        scene = ElectroScene(editor, self)
+        scene.setNum(self._num)
+        scene.setName(self._name)
+        self._sceneView = ElectroSceneView(editor, scene)
+        self.layout().addWidget(self._sceneView)
+        if editor.keyCTRL:
+            scene.keyCTRLPress()
+            self._sceneView.keyCTRLPress()
+        if editor.keyShift:
+            scene.keyShiftPress()
+            self._sceneView.keyShiftPress()
+
+        itemsData = self._itemsData
+        # summary entries are replaced by items being added to scene
+        invalid = set()
+        if itemsData:
+            for id in self.summary()['ids']:
+                editor.removeItemPage(id, self)
+            for (pos, error) in self.summary()['invalid']:
+                invalid.add(pos)
+                self._invalidItemsData.append(itemsData[pos])
+        self._itemsData = None
+        self._summary = None
+        editor.componentInstances.removePage(self)
+        if not itemsData:
+            return
+
+        print("materialize page %d" % self._num)
+        listUpdateParentComponents = []
+        for pos in range(len(itemsData)):
+            if pos in invalid:
+                continue
+            itemProp = itemsData[pos]
+            item = createGraphicsObjectByProperties(itemProp, True)
+            if not item:
+                continue
+
+            if item.type() == GROUP_TYPE and 'parentComponentId' in itemProp:
+                listUpdateParentComponents.append((item,
+                                                   itemProp['parentComponentId']))
+            scene.addGraphicsItem(item)
+        scene.update()
+
+        # actualize parent to sub components, parent may be on other page
+        for (group, parentId) in listUpdateParentComponents:
+            parentGroup = editor.itemById(parentId)
+            group.setParentComponentGroup(parentGroup)
+
+        # building items from file is not an edit
+        scene.journalClear()
+
+
+    def itemsData(self):
+        return self._itemsData
+
+
+    def serializationCache(self):
+        revision = None
+        if self.isMaterialized():
+            revision = self.scene().revision
+        key = (revision, self._num, self._name, self.editor.componentsRevision)
+
+        cache = self._serializationCache
+        if cache and cache['key'] == key:
+            return cache
+
+        itemsData = self._itemsData
+        if self.isMaterialized():
+            itemsData = []
+            for item in self.scene().graphicsItems():
+                itemsData.append(item.properties())
+            itemsData += self._invalidItemsData
+
+        # 'fragment' is filled by ProjectSaver after page encoding
+        self._serializationCache = {'key': key,
+                                    'data': {"num": self._num,
+                                             "name": self._name,
+                                             "items": itemsData},
+                                    'fragment': None}
+        return self._serializationCache
+
+
+    def hasItemId(self, id):
+        return self in self.editor.itemPages.get(id, [])
+
+
+    def summary(self):
+        if self._summary is None:
+            self._summary = preparsePage(self._itemsData)
+        return self._summary
+
+
+    def componentsData(self):
+        return self.summary()['components']
+
+
+    def subComponentsData(self, parentGroup):
+        # parentComponentId is resolved only for top level items
+        subComponents = []
+        if parentGroup.parent():
+            return subComponents
+        for componentData in self.componentsData():
+            if not componentData['topLevel']:
+                continue
+            if componentData['parentComponentId'] == parentGroup.id():
+                subComponents.append(componentData)
+        return subComponents
 
 
     def setNum(self, num):
-        self.scene().setNum(num)
+        self._num = num
+        if self.isMaterialized():
+            self.scene().setNum(num)
 
 
     def num(self):
-        return self.scene().num()
+        return self._num
 
 
     def name(self):
-        return self.scene().name()
+        return self._name
+
+
+    def setJournalKey(self, key):
+        self._journalKey = key
+
+
+    def journalKey(self):
+        return self._journalKey
 
 
     def setName(self, name):
-        self.scene().setName(name)
+        self._name = name
+        if self.isMaterialized():
+            self.scene().setName(name)
 
 
     def scene(self):
+        self.materialize()
         return self._sceneView.scene()
 
 
     def sceneView(self):
+        self.materialize()
         return self._sceneView
 
 
     def remove(self):
+        self.editor.linkPageConnections(self)
         scene = self.scene()
         scene.removeGraphicsItems(scene.graphicsItems())
         self.editor.pages.remove(self)
@@ -1623,55 +2416,139 @@ class PageWidget(QWidget):
 
 
 
+thumbnailPlaceholders = {}  # by thumbnail size
+
+def thumbnailPlaceholder(size):
+    if not size:
+        size = (100, 50)
+    size = tuple(size)
+    if size not in thumbnailPlaceholders:
+        pixmap = QPixmap(size[0], size[1])
+        pixmap.fill(QColor(240, 240, 240))
+        thumbnailPlaceholders[size] = pixmap
+    return thumbnailPlaceholders[size]
+
+
 class Component(QListWidgetItem):
     def __init__(self, name, group=None):
         QListWidgetItem.__init__(self)
         self._name = name
         self._groupProperties = None
-        self._image = None
+        self._indexEntry = None
+        self._indexStamp = None
+        self._library = None  # library component was read from, None for components directory
+        self._texts = None
+        self._template = None
+        self._thumbnailSource = None
+        self._thumbnailSize = None
         if group:
+            # library file doesn't refer to itself, placed groups get
+            # component name in group()
             self._groupProperties = group.properties()
+            self._groupProperties.pop('component', None)
         pass
 
 
     def load(self):
-        f = open("%s/%s.ec" % (componentsPath(), self._name), "r")
-        content = f.read()
-        self._groupProperties = json.loads(content)
+        if not self.loadProperties():
+            return False
+
+        self.setThumbnailFile()
+        return True
 
-        f.close()
 
-        self._image = QImage()
-        self._image.load("%s/%s.png" % (componentsPath(), self._name))
+    def setThumbnailFile(self):
+        # thumbnail is decoded when it becomes visible,
+        # only its size is read now
+        fileName = "%s/%s.png" % (componentsPath(), self._name)
+        size = QImageReader(fileName).size()
+        self._thumbnailSource = fileName
+        self._thumbnailSize = None
+        if size.isValid():
+            self._thumbnailSize = (size.width(), size.height())
+        self.setThumbnail(None)
 
-        pixMap = QPixmap.fromImage(self.image())
-        self.setData(Qt.DecorationRole, pixMap)
+
+    def loadProperties(self):
+        try:
+            if self._library:
+                content = self._library.read(self._name, '.ec').decode('utf-8')
+            else:
+                f = open("%s/%s.ec" % (componentsPath(), self._name), "r")
+                content = f.read()
+                f.close()
+            self._groupProperties = json.loads(content)
+            self._template = None
+        except (OSError, ValueError):
+            return False
         return True
 
 
-    def save(self):
-        group = self.group()
-        rect = mapToGrid(group.boundingRect(), MAX_GRID_SIZE)
-        rect = QRectF(0, 0,
-                      rect.width() + MAX_GRID_SIZE * 2,
-                      rect.height() + MAX_GRID_SIZE * 2)
-        tempScene = QGraphicsScene()
-        tempScene.setSceneRect(rect)
-        group.setIndex(0)
-        group.setPos(QPointF(MAX_GRID_SIZE, MAX_GRID_SIZE))
-        group.setScene(tempScene)
-
-        self._image = QImage(rect.size().toSize(), QImage.Format_ARGB32)
-        self._image.fill(Qt.transparent)
-        painter = QPainter(self._image)
-        tempScene.render(painter)
-        painter.end()
-
-        self._image = self._image.scaledToWidth(100, Qt.SmoothTransformation)
-        if self._image.height() > 80:
-            self._image = self._image.scaledToHeight(100, Qt.SmoothTransformation)
-        self._image.save("%s/%s.png" % (componentsPath(), self._name))
+    def setIndexEntry(self, entry, thumbnailData, library=None):
+        # component definition is parsed on first use
+        self._indexEntry = entry
+        self._library = library
+        self.setIndexStamp(entry)
+        self._texts = entry.get('texts')
+        self._groupProperties = None
+        self._template = None
+        self._thumbnailSource = thumbnailData
+        self._thumbnailSize = entry.get('imageSize')
+        self.setThumbnail(None)
+
+
+    def library(self):
+        return self._library
+
+
+    def isEditable(self):
+        # only components directory is changed by editor
+        if not self._library:
+            return True
+        return self._library.path() == os.path.abspath(componentsPath())
 
+
+    def fileName(self, extension):
+        if not self._library:
+            return "%s/%s%s" % (componentsPath(), self._name, extension)
+        return self._library.fileName(self._name, extension)
+
+
+    def texts(self):
+        if self._texts is None:
+            self._texts = componentTexts(self.groupProperties() or {})
+        return self._texts
+
+
+    def setIndexStamp(self, entry):
+        # entry: library index entry or None for component files written by editor
+        self._indexStamp = None
+        if entry:
+            self._indexStamp = (entry['library'], entry['stamp'], entry['pngStamp'])
+
+
+    def indexStamp(self):
+        return self._indexStamp
+
+
+    def thumbnailSource(self, ratio=1):
+        # HiDPI thumbnail is used when it is near component definition
+        if ratio > 1:
+            fileName = self.fileName('@2x.png')
+            if fileName and os.path.isfile(fileName):
+                return fileName
+        return self._thumbnailSource
+
+
+    def setThumbnail(self, pixmap):
+        # placeholder of the same size is shown until thumbnail is decoded
+        if not pixmap:
+            pixmap = thumbnailPlaceholder(self._thumbnailSize)
+        self.setData(Qt.DecorationRole, pixmap)
+
+
+    def save(self):
+        # thumbnails are rendered by ThumbnailRenderer
         jsonProp = json.dumps(self._groupProperties, indent=2, sort_keys=True, ensure_ascii=False)
         f = open("%s/%s.ec" % (componentsPath(), self._name), "w")
         f.write(jsonProp)
@@ -1681,18 +2558,33 @@ class Component(QListWidgetItem):
 
     def removeFiles(self):
         os.remove("%s/%s.ec" % (componentsPath(), self._name))
-        os.remove("%s/%s.png" % (componentsPath(), self._name))
+        for scale in THUMBNAIL_SCALES:
+            fileName = thumbnailFileName("%s/%s" % (componentsPath(), self._name), scale)
+            if os.path.exists(fileName):
+                os.remove(fileName)
 
 
     def group(self):
-        if not self._groupProperties:
+        if not self.groupProperties():
             return False
-        group = createGraphicsObjectByProperties(self._groupProperties)
+        group = createGraphicsObjectByProperties(self.template(), template=True)
+        group.setComponentName(self._name)
         return group
 
 
-    def image(self):
-        return self._image
+    def template(self):
+        # parsed once, each placement is created from it without copying
+        if self._template is None:
+            self._template = componentTemplate(self.groupProperties())
+        return self._template
+
+
+    def groupProperties(self):
+        if self._groupProperties is None and self._indexEntry:
+            if not self.loadProperties():
+                print("error loading component %s" % self._name)
+            self._indexEntry = None
+        return self._groupProperties
 
 
     def name(self):
@@ -1700,9 +2592,12 @@ class Component(QListWidgetItem):
 
 
     def prefixName(self):
-        if not 'prefixName' in self._groupProperties:
+        if self._groupProperties is None and self._indexEntry:
+            return self._indexEntry['prefixName']
+        properties = self.groupProperties()
+        if not properties or not 'prefixName' in properties:
             return ""
-        return self._groupProperties['prefixName']
+        return properties['prefixName']
 
 
 
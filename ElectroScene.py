@@ -36,6 +36,7 @@ from GraphicsItemRect import *
 from GraphicsItemGroup import *
 from GraphicsItemLink import *
 from GraphicsItemText import *
+from SpatialHash import *
 
 
 
@@ -43,13 +44,20 @@ from GraphicsItemText import *
 
 
 class ElectroScene(QGraphicsScene):
+    selectedItemsChanged = pyqtSignal()
 
-
-    def __init__(self, editor):
+    def __init__(self, editor, page=None):
         QGraphicsScene.__init__(self)
         self._num = 0  # Scene number
         self.editor = editor
+        self._page = page  # PageWidget of scene
         self.graphicsItemsList = []
+        self.graphicsItemsByType = {}  # top level items of each type in graphicsItemsList order
+        self.graphicsItemsSet = {}  # top level items of graphicsItemsList
+        self.graphicsItemsById = {}  # top level items list by id, ids may be duplicated
+        self.selectedItems = {}  # selected items in selection order
+        self.hoveredItem = None  # top level item under mouse cursor
+        self.highlightedItems = []  # hovered item and its highlighted relatives
         self.drawingLine = None
         self.drawingRect = None
         self.drawingEllipse = None
@@ -70,6 +78,9 @@ class ElectroScene(QGraphicsScene):
         self.minGridSize = MAX_GRID_SIZE / 4
         self.gridSize = self.minGridSize
         self.history = History(self)
+        self.revision = 0  # incremented on each change of page items
+        self.journalItems = {}  # items added or changed since last journal record
+        self.journalRemovedIds = []
 
         self.cursorX = QGraphicsLineItem(None)
         self.cursorY = QGraphicsLineItem(None)
@@ -78,7 +89,17 @@ class ElectroScene(QGraphicsScene):
         self.cursorX.setPen(QPen(Qt.blue, 1, Qt.SolidLine))
         self.cursorY.setPen(QPen(Qt.blue, 1, Qt.SolidLine))
 
-        self.interceptionPoints = []
+        self.interceptionPoints = {}  # junction point ellipses by point key
+        self.interceptionPointsHidden = False
+        self.changedLines = {}  # lines changed since last junctions update
+        self.changedPointItems = {}  # items changed since last points index update
+        self.indexedPoints = {}  # item: point keys as it was indexed
+        self.pointItems = {}  # point key: {item: None}
+        self.textItems = {}  # texts of any nesting level
+        self.indexedLines = {}  # line: {'tips', 'trace'} as it was indexed
+        self.lineTips = {}  # tips of top level lines: {'point', 'lines'} by point key
+        self.lineTipsHash = SpatialHash(MAX_GRID_SIZE)  # point keys of lineTips
+        self.traceLines = SpatialHash(MAX_GRID_SIZE)  # trace lines of any nesting
 
         self.horizontalFieldsCount = 21
         self.verticalFieldsCount = 16
@@ -104,17 +125,57 @@ class ElectroScene(QGraphicsScene):
                                    pix(self.sceneRectSize.y()))
 
         # run periodical updater
+        # run updater after changes, it's stopped while nothing changes
         def timeoutUpdater():
             self.updateCounter -= 1
-            if self.updateCounter <= 0 or self.updateCounter > 1:
+            if self.updateCounter > 1:
                 return
+            self.updaterTimer.stop()
             print("run update")
             self.update()
 
         self.updateCounter = 0
         self.updaterTimer = QTimer()
         self.updaterTimer.timeout.connect(timeoutUpdater)
-        self.updaterTimer.start(500)
+
+
+    def markChanged(self, items=None):
+        self.revision += 1
+        if items:
+            self.journalTouch(items)
+
+
+    def journalTouch(self, items):
+        for item in items:
+            item = item.root()
+            self.journalItems[id(item)] = item
+        self.editor.journalSchedule()
+
+
+    def journalRemove(self, item):
+        self.journalItems.pop(id(item), None)
+        self.journalRemovedIds.append(item.id())
+        self.editor.journalSchedule()
+
+
+    def journalClear(self):
+        self.journalItems = {}
+        self.journalRemovedIds = []
+
+
+    def takeJournalDelta(self):
+        if not self.journalItems and not self.journalRemovedIds:
+            return None
+
+        itemsData = []
+        for item in self.journalItems.values():
+            if item.scene() is not self:
+                continue
+            itemsData.append(item.properties())
+        delta = {"set": itemsData,
+                 "removed": self.journalRemovedIds}
+        self.journalClear()
+        return delta
 
 
     def setNum(self, num):
@@ -125,6 +186,10 @@ class ElectroScene(QGraphicsScene):
         return self._num
 
 
+    def page(self):
+        return self._page
+
+
     def setName(self, name):
         self._name = name
 
@@ -317,8 +382,11 @@ class ElectroScene(QGraphicsScene):
 
 
     def resetSelectionItems(self):
-        for item in self.selectedGraphicsItems():
-            self.itemRemoveFromSelection(item)
+        if not self.selectedItems:
+            return
+        for item in list(self.selectedItems):
+            self.itemUnselect(item)
+        self.selectedItemsChanged.emit()
 
 
     def mousePressEventStartRectSelection(self, ev):
@@ -369,7 +437,7 @@ class ElectroScene(QGraphicsScene):
 
             # stop drawing if line on component
             if self.drawingLine and lineType == 'trace':
-                for item in self.allGraphicsItems():
+                for item in self.itemsAtPoint(p):
                     if item == self.drawingLine:
                         continue
                     if item.setSelectPoint(p):
@@ -602,7 +670,9 @@ class ElectroScene(QGraphicsScene):
 
         self.movedPointItems = []
         point = self.mapToGrid(ev.scenePos())
-        for item in self.graphicsItems():
+        for item in self.itemsAtPoint(point):
+            if item.parent():
+                continue
             if item.setSelectPoint(point):
                 print("add to move point item %d" % item.id())
                 self.movedPointItems.append(item)
@@ -620,7 +690,7 @@ class ElectroScene(QGraphicsScene):
 
         self.intersectionPointsHide()
         p = self.mapToGrid(ev.scenePos())
-        for item in self.graphicsItems():
+        for item in self.movedPointItems:
             if item.isPointSelected():
                 item.modifySelectedPoint(p)
         self.calculateSelectionCenter()
@@ -653,39 +723,52 @@ class ElectroScene(QGraphicsScene):
 
 
     def mouseMoveEventDisplayPoints(self, pos):
-        items = self.graphicsItems()
-        if not len(items):
+        item = self.graphicItemByCoordinate(pos)
+        if item == self.hoveredItem:
             return
 
-        self.editor.setStatusGraphicsItemInfo(None)
-        self.editor.showGroupInfo(None)
-        for item in items:
-            item.unHighlight()
-            if item.type() == GROUP_TYPE:
-                subItems = self.subComponentGroups(item)
-                for subItem in subItems:
-                    subItem.unHighlight()
-
-            if not item.isSelected():
-                item.markPointsHide()
-
-        item = self.graphicItemByCoordinate(pos)
+        self.hoverReset()
         if not item:
             return
+        self.hoveredItem = item
         item.markPointsShow()
         item.highlight()
+        self.highlightedItems.append(item)
         if item.type() == GROUP_TYPE:
             subItems = self.subComponentGroups(item)
             for subItem in subItems:
                 subItem.highlight()
+                self.highlightedItems.append(subItem)
         if item.type() == LINK_TYPE:
             remoteItem = item.remoteLinkPoint()
             if remoteItem:
                 remoteItem.highlight()
+                self.highlightedItems.append(remoteItem)
         self.editor.setStatusGraphicsItemInfo(item)
         self.editor.showGroupInfo(item)
 
 
+    def hoverReset(self):
+        self.editor.setStatusGraphicsItemInfo(None)
+        self.editor.showGroupInfo(None)
+        for item in self.highlightedItems:
+            item.unHighlight()
+        self.highlightedItems = []
+
+        item = self.hoveredItem
+        self.hoveredItem = None
+        if item and not item.isSelected():
+            item.markPointsHide()
+
+
+    def highlightItem(self, item):
+        # highlighted until mouse cursor is moved to other item
+        self.hoverReset()
+        self.hoveredItem = item
+        item.highlight()
+        self.highlightedItems.append(item)
+
+
     def mouseMoveEventModeUseTool(self, point):
         self.drawCursor(point)
         if (self.currentTool() == 'traceLine' or
@@ -850,7 +933,7 @@ class ElectroScene(QGraphicsScene):
     def graphicItemByCoordinate(self, point):
         item = self.itemAt(point, self.views()[0].transform())
         if not item or not self.isGraphicsItem(item):
-            return False
+            return None
         return item.root()
 
 
@@ -1122,18 +1205,22 @@ class ElectroScene(QGraphicsScene):
 
     def selectedGraphicsItems(self, type=None):
         items = []
-        for item in self.graphicsItems(type):
+        for item in self.selectedItems:
+            if type and item.type() != type:
+                continue
             if not item.isSelected():
                 continue
+            if not self.isTopLevelItem(item):
+                continue
             items.append(item)
         return items
 
 
     def itemById(self, id):
-        for item in self.graphicsItems():
-            if item.id() == id:
-                return item
-        return None
+        items = self.graphicsItemsById.get(id)
+        if not items:
+            return None
+        return items[0]
 
 
     def setTool(self, tool):
@@ -1204,6 +1291,9 @@ class ElectroScene(QGraphicsScene):
     def itemAddToSelection(self, item, fast=False):
         item.select()
         item.markPointsShow()
+        if item not in self.selectedItems:
+            self.selectedItems[item] = True
+            self.selectedItemsChanged.emit()
         if not fast:
             self.calculateSelectionCenter()
 
@@ -1214,10 +1304,29 @@ class ElectroScene(QGraphicsScene):
 
 
     def itemRemoveFromSelection(self, item):
+        if self.itemUnselect(item):
+            self.selectedItemsChanged.emit()
+
+
+    def itemUnselect(self, item):
+        selected = item in self.selectedItems
+        if selected:
+            del self.selectedItems[item]
         item.resetSelection(True)
         item.markPointsHide()
         item.unHighlight()
-        return
+        if item is self.hoveredItem:
+            # hovered item is highlighted again by next mouse move
+            self.hoveredItem = None
+        return selected
+
+
+    def itemSelectionReset(self, item):
+        # selection is reset by item itself, e.g. by setProperties()
+        if item not in self.selectedItems:
+            return
+        del self.selectedItems[item]
+        self.selectedItemsChanged.emit()
 
 
     def copySelectedToClipboard(self):
@@ -1302,11 +1411,57 @@ class ElectroScene(QGraphicsScene):
     def graphicsItems(self, type=None):
         if not type:
             return self.graphicsItemsList
-        items = []
-        for item in self.graphicsItemsList:
-            if item.type() == type:
-                items.append(item)
-        return items
+        return self.graphicsItemsByType.setdefault(type, [])
+
+
+    def graphicsItemsAppend(self, item):
+        self.graphicsItemsList.append(item)
+        self.graphicsItemsByType.setdefault(item.type(), []).append(item)
+        self.graphicsItemsSet[item] = True
+        self.itemsByIdAdd(item, item.id())
+        # item may be restored by history being selected
+        if item.isSelected() and item not in self.selectedItems:
+            self.selectedItems[item] = True
+            self.selectedItemsChanged.emit()
+
+
+    def graphicsItemsRemove(self, item):
+        self.graphicsItemsList.remove(item)
+        self.graphicsItemsByType[item.type()].remove(item)
+        del self.graphicsItemsSet[item]
+        self.itemsByIdRemove(item, item.id())
+        if item in self.selectedItems:
+            del self.selectedItems[item]
+            self.selectedItemsChanged.emit()
+        if item is self.hoveredItem:
+            self.hoverReset()
+
+
+    def isTopLevelItem(self, item):
+        return item in self.graphicsItemsSet
+
+
+    def itemsByIdAdd(self, item, id):
+        items = self.graphicsItemsById.setdefault(id, [])
+        items.append(item)
+        if len(items) == 1:
+            self.editor.setItemPage(id, self._page)
+
+
+    def itemsByIdRemove(self, item, id):
+        items = self.graphicsItemsById[id]
+        items.remove(item)
+        if not items:
+            del self.graphicsItemsById[id]
+            self.editor.removeItemPage(id, self._page)
+
+
+    def itemIdChanged(self, item, oldId):
+        # nested items ids are unique inside of their group only
+        if not self.isTopLevelItem(item):
+            return
+        self.itemsByIdRemove(item, oldId)
+        self.itemsByIdAdd(item, item.id())
 
 
     def unpackAllItems(self, items, type):
@@ -1344,8 +1499,21 @@ class ElectroScene(QGraphicsScene):
         if not self.isGraphicsItem(item):
             return
 
-        self.graphicsItemsList.append(item)
+        self.graphicsItemsAppend(item)
         item.setScene(self)
+        self.itemsChanged(item)
+        for group in self.unpackAllItems([item], GROUP_TYPE):
+            self.componentGroupChanged(group)
+        self.markChanged([item])
+
+
+    def componentGroupChanged(self, group):
+        self.editor.componentInstances.addGroup(self._page, group)
+
+
+    def unregisterComponentGroups(self, item):
+        for group in self.unpackAllItems([item], GROUP_TYPE):
+            self.editor.componentInstances.removeGroup(group)
 
 
     def addGraphicsItems(self, items):
@@ -1383,10 +1551,14 @@ class ElectroScene(QGraphicsScene):
         group.assignNewId()
         group.setName(name)
         self.resetSelectionItems()
+        self.markChanged()
 
         # remove items from scene
         for item in cleanItems:
-            self.graphicsItemsList.remove(item)
+            self.journalRemove(item)
+            self.unregisterComponentGroups(item)
+            self.itemsChanged(item)
+            self.graphicsItemsRemove(item)
             item.removeFromQScene()
         group.addItems(cleanItems)
         self.addGraphicsItem(group)
@@ -1422,14 +1594,18 @@ class ElectroScene(QGraphicsScene):
 
     def removeGraphicsItem(self, item):
         print("removeGraphicsItem %d" % item.id())
-        if item in self.graphicsItemsList:
-            self.graphicsItemsList.remove(item)
+        self.markChanged()
+        if self.isTopLevelItem(item):
+            self.journalRemove(item)
+            self.graphicsItemsRemove(item)
         if item.type() == GROUP_TYPE:
             subComponents = self.editor.subComponentGroups(item)
             for subComponent in subComponents:
                 subComponent.setParentComponentGroup(None)
                 self.editor.setUniqueComponentIndex(subComponent)
                 self.editor.updateSubComponentsView(subComponent)
+        self.unregisterComponentGroups(item)
+        self.itemsChanged(item)
         item.removeFromQScene()
         item.remove()
 
@@ -1500,6 +1676,7 @@ class ElectroScene(QGraphicsScene):
     def changeSelectedLinesType(self):
         items = self.selectedGraphicsItems()
         self.resetSelectionItems()
+        self.markChanged(items)
         for item in items:
             if item.type() != LINE_TYPE:
                 continue
@@ -1513,90 +1690,205 @@ class ElectroScene(QGraphicsScene):
 
     def asyncUpdate(self):
         self.updateCounter = 4
+        if not self.updaterTimer.isActive():
+            self.updaterTimer.start(500)
 
 
     def update(self):
         QGraphicsScene.update(self)
         self.intersectionPointsShow()
+        self.updatePointsIndex()
+
+
+    def itemChanged(self, item):
+        # points index is updated on next lookup, junction points
+        # near line are updated on next update()
+        self.changedPointItems[item] = None
+        if item.type() == LINE_TYPE:
+            self.changedLines[item] = None
+            self.asyncUpdate()
+
+
+    def itemsChanged(self, item):
+        for subItem in self.unpackAllItems([item], None):
+            self.itemChanged(subItem)
+
+
+    def updatePointsIndex(self):
+        changedItems = self.changedPointItems
+        self.changedPointItems = {}
+        for item in changedItems:
+            pointKeys = self.indexedPoints.pop(item, [])
+            for pointKey in pointKeys:
+                items = self.pointItems[pointKey]
+                del items[item]
+                if not items:
+                    del self.pointItems[pointKey]
+            self.textItems.pop(item, None)
+
+            if item.scene() != self:
+                continue
+            if item.type() == TEXT_TYPE:
+                self.textItems[item] = None
+                continue
+            if item.type() not in [LINE_TYPE, RECT_TYPE, ELLIPSE_TYPE]:
+                continue
+
+            pointKeys = set()
+            for point in item.points() + [item.pos()]:
+                pointKeys.add((round(point.x()), round(point.y())))
+            for pointKey in pointKeys:
+                self.pointItems.setdefault(pointKey, {})[item] = None
+            self.indexedPoints[item] = pointKeys
+
+
+    def itemsAtPoint(self, point):
+        # items of any nesting level which may have one of its points in
+        # point, texts are always returned because their points are
+        # changed while text is edited
+        self.updatePointsIndex()
+        items = list(self.pointItems.get((round(point.x()), round(point.y())), {}))
+        return items + list(self.textItems)
 
 
     def intersectionPointsHide(self):
-        if not self.interceptionPoints:
+        if self.interceptionPointsHidden:
             return
-        for point in self.interceptionPoints:
-            if point.scene():
-                self.removeItem(point)
+        self.interceptionPointsHidden = True
+        for pointEllipse in self.interceptionPoints.values():
+            pointEllipse.setVisible(False)
 
 
     def intersectionPointsShow(self):
-        self.intersectionPointsHide()
-
-#        items = self.graphicsUnpackedItems()
-        items = self.graphicsItems()
-        if not len(items):
+        self.updateJunctions()
+        if not self.interceptionPointsHidden:
             return
+        self.interceptionPointsHidden = False
+        for pointEllipse in self.interceptionPoints.values():
+            pointEllipse.setVisible(True)
 
-        # accumulate lines tip intersection
-        listPoints = {}
-        for item in items:
-            if item.type() != LINE_TYPE:
-                continue
 
-            traceLine = False
-            if item.typeLine() == 'trace':
-                traceLine = True
-
-            points = item.points()
-            for itemP in points:
-                pointStr = "%dx%d" % (itemP.x(), itemP.y())
-                if pointStr in listPoints:
-                    listPoints[pointStr]['cnt'] += 1
-                else:
-                    listPoints[pointStr] = {'cnt': 1,
-                                            'point': itemP,
-                                            'item': item,
-                                            'tracePoint': False}
-                if traceLine:
-                    listPoints[pointStr]['tracePoint'] = True
-
-        # accumulate line to tip intersection
-        showPoints = []
-        for point, data in listPoints.items():
-            if data['cnt'] > 2 and data['tracePoint']:
-                showPoints.append(data['point'])
-                continue
+    def updateJunctions(self):
+        if not self.changedLines:
+            return
 
-            for item in self.graphicsUnpackedItems():
-                if item.type() != LINE_TYPE:
-                    continue
+        # line tips which may become or stop being junction
+        pointKeys = {}
+        changedLines = self.changedLines
+        self.changedLines = {}
+        for line in changedLines:
+            self.unindexLine(line, pointKeys)
+            if line.scene() == self:
+                self.indexLine(line, pointKeys)
+
+        for pointKey in pointKeys:
+            self.updateJunction(pointKey)
+
+
+    def indexLine(self, line, pointKeys):
+        # tips are counted for top level lines, trace lines of any
+        # nesting level make junctions with tips lying on them
+        topLevel = line.parent() is None
+        trace = line.typeLine() == 'trace'
+        if not topLevel and not trace:
+            return
 
-                if item.typeLine() != 'trace':
-                    continue
+        tips = []
+        if topLevel:
+            for point in line.points():
+                pointKey = (int(point.x()), int(point.y()))
+                tip = self.lineTips.get(pointKey)
+                if not tip:
+                    tip = {'point': point, 'lines': {}}
+                    self.lineTips[pointKey] = tip
+                    self.lineTipsHash.insertSegment(pointKey, point.x(), point.y(),
+                                                    point.x(), point.y())
+                tip['lines'][line] = tip['lines'].get(line, 0) + 1
+                tips.append(pointKey)
+                pointKeys[pointKey] = None
+
+        if trace:
+            p1 = line.p1()
+            p2 = line.p2()
+            # margin is wider than any trace pen
+            self.traceLines.insertSegment(line, p1.x(), p1.y(), p2.x(), p2.y(),
+                                          self.minGridSize)
+            for cell in self.traceLines.itemCells(line):
+                for pointKey in self.lineTipsHash.cellItems(cell):
+                    pointKeys[pointKey] = None
+
+        self.indexedLines[line] = {'tips': tips, 'trace': trace}
+
+
+    def unindexLine(self, line, pointKeys):
+        indexed = self.indexedLines.pop(line, None)
+        if not indexed:
+            return
 
-                if item == data['item']:
-                    continue
+        for pointKey in indexed['tips']:
+            pointKeys[pointKey] = None
+            tip = self.lineTips[pointKey]
+            tip['lines'][line] -= 1
+            if not tip['lines'][line]:
+                del tip['lines'][line]
+            if not tip['lines']:
+                del self.lineTips[pointKey]
+                self.lineTipsHash.remove(pointKey)
+
+        if indexed['trace']:
+            for cell in self.traceLines.itemCells(line):
+                for pointKey in self.lineTipsHash.cellItems(cell):
+                    pointKeys[pointKey] = None
+            self.traceLines.remove(line)
+
+
+    def isJunction(self, pointKey):
+        tip = self.lineTips.get(pointKey)
+        if not tip:
+            return False
 
-                localPos = data['point'] - item.pos()
-                if not item.contains(localPos):
-                    continue
+        # accumulate lines tip intersection
+        tracePoint = False
+        for line in tip['lines']:
+            if line.typeLine() == 'trace':
+                tracePoint = True
+        if sum(tip['lines'].values()) > 2 and tracePoint:
+            return True
+
+        # line to tip intersection
+        point = tip['point']
+        for line in self.traceLines.itemsAt(point.x(), point.y()):
+            if line in tip['lines']:
+                continue
 
-                busy = False
-                for p in item.points():
-                    if p == data['point']:
-                        busy = True
+            localPos = point - line.pos()
+            if not line.contains(localPos):
+                continue
 
-                if busy:
-                    continue
+            if point in line.points():
+                continue
+            return True
+        return False
 
-                showPoints.append(data['point'])
 
-        for point in showPoints:
-            pointEllipse = QGraphicsEllipseItem()
-            pointEllipse.setBrush(Qt.black)
-            pointEllipse.setPos(point - QPointF(3, 3))
-            pointEllipse.setRect(QRectF(0, 0, 6, 6))
-            self.addItem(pointEllipse)
-            self.interceptionPoints.append(pointEllipse)
+    def updateJunction(self, pointKey):
+        pointEllipse = self.interceptionPoints.get(pointKey)
+        if not self.isJunction(pointKey):
+            if pointEllipse:
+                self.removeItem(pointEllipse)
+                del self.interceptionPoints[pointKey]
+            return
+
+        if pointEllipse:
+            return
+        point = self.lineTips[pointKey]['point']
+        pointEllipse = QGraphicsEllipseItem()
+        pointEllipse.setBrush(Qt.black)
+        pointEllipse.setPos(point - QPointF(3, 3))
+        pointEllipse.setRect(QRectF(0, 0, 6, 6))
+        pointEllipse.setVisible(not self.interceptionPointsHidden)
+        self.addItem(pointEllipse)
+        self.interceptionPoints[pointKey] = pointEllipse
 
 
     def subComponentGroups(self, parentGroup):
@@ -1691,7 +1983,7 @@ class RectDrawing():
 class MouseSelectionDrawing(RectDrawing):
     def __init__(self, scene, startPoint):
         RectDrawing.__init__(self, scene, QPen(Qt.black, 1, Qt.DashLine), startPoint)
-        self._selectedItems = scene.selectedGraphicsItems()
+        self._selectedItems = set(scene.selectedGraphicsItems())
 
 
     def setEndPoint(self, endPoint):
@@ -1700,12 +1992,8 @@ class MouseSelectionDrawing(RectDrawing):
             return False
 
         # unSelect all besides selected early
-        for item in self._scene.graphicsItems():
-            selected = False
-            for selItem in self._selectedItems:
-                if item == selItem:
-                    selected = True
-            if selected:
+        for item in self._scene.selectedGraphicsItems():
+            if item in self._selectedItems:
                 continue
             self._scene.itemRemoveFromSelection(item)
 
@@ -31,6 +31,8 @@ from pprint import *
 import json
 from curses.textpad import rectangle
 import copy
+import threading
+from types import MappingProxyType
 
 
 MAX_GRID_SIZE = 20
@@ -38,6 +40,7 @@ MAX_GRID_SIZE = 20
 
 class GraphicsItem():
     lastId = 0
+    idLock = threading.Lock()  # items are also created by thumbnail rendering thread
     MARK_SIZE = 8
 
     def __init__(self):
@@ -72,8 +75,11 @@ class GraphicsItem():
 
 
     def assignNewId(self):
-        GraphicsItem.lastId += 1
-        self._id = GraphicsItem.lastId
+        oldId = self._id
+        with GraphicsItem.idLock:
+            GraphicsItem.lastId += 1
+            self._id = GraphicsItem.lastId
+        self.idChanged(oldId)
         print("new item was created %d, type = %s, name = %s" % (self.id(),
                                                                 self.typeName(),
                                                                 self.name()))
@@ -88,9 +94,19 @@ class GraphicsItem():
 
 
     def setId(self, id):
-        if id > GraphicsItem.lastId:
-            GraphicsItem.lastId = id
+        oldId = self._id
+        with GraphicsItem.idLock:
+            if id > GraphicsItem.lastId:
+                GraphicsItem.lastId = id
         self._id = id
+        self.idChanged(oldId)
+
+
+    def idChanged(self, oldId):
+        # editor scene keeps items by id
+        scene = self.scene()
+        if scene and hasattr(scene, 'itemIdChanged'):
+            scene.itemIdChanged(self, oldId)
 
 
     def addr(self):
@@ -220,6 +236,10 @@ class GraphicsItem():
 
     def resetSelection(self, fast=False):
         self.selected = False
+        # editor scene keeps selected items
+        scene = self.scene()
+        if scene and hasattr(scene, 'itemSelectionReset'):
+            scene.itemSelectionReset(self)
         if fast:
             return
         self.markPointsHide()
@@ -285,6 +305,20 @@ class GraphicsItem():
         return False
 
 
+    def geometryChanged(self):
+        # editor scene keeps index of items points and junction points
+        scene = self.scene()
+        if scene and hasattr(scene, 'itemChanged'):
+            scene.itemChanged(self)
+
+
+    def propertiesChanged(self):
+        # changes not recorded by history are saved too
+        scene = self.scene()
+        if scene and hasattr(scene, 'markChanged'):
+            scene.markChanged([self])
+
+
     def resetSelectionPoint(self):
         pass
 
@@ -301,6 +335,20 @@ class GraphicsItem():
         return
 
 
+    def newMarkPoint(self):
+        markPoint = QGraphicsRectItem(None)
+        self.scene().addItem(markPoint)
+        markPoint.setZValue(0)
+        markPoint.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+        return markPoint
+
+
+    def moveMarkPoint(self, markPoint, point):
+        x1 = point.x() - self.MARK_SIZE / 2
+        y1 = point.y() - self.MARK_SIZE / 2
+        markPoint.setRect(x1, y1, self.MARK_SIZE, self.MARK_SIZE)
+
+
     def points(self):
         return []
 
@@ -340,8 +388,10 @@ class GraphicsItem():
         return properties;
 
 
-    def setProperties(self, properties, setId=False):
-        properties = copy.deepcopy(properties)
+    def setProperties(self, properties, setId=False, template=False):
+        # template: properties made by componentTemplate(), used without copying
+        if not template:
+            properties = copy.deepcopy(properties)
         self.resetSelection()
 
         newMountPoint = QPointF(properties['mountPoint']['x'],
@@ -482,7 +532,38 @@ def mapToGrid(arg, gridSize):
         return rect
 
 
-def createGraphicsObjectByProperties(ogjectProperties, withId=False):
+def _frozen(value):
+    if isinstance(value, dict):
+        return MappingProxyType({name: _frozen(v) for (name, v) in value.items()})
+    if isinstance(value, list):
+        return tuple(_frozen(v) for v in value)
+    return value
+
+
+def componentTemplate(properties, parentPos=None):
+    # immutable copy of item properties with absolute mount points
+    # of nested items, instantiated without copying by
+    # createGraphicsObjectByProperties(template, template=True)
+    template = {}
+    for (name, value) in properties.items():
+        if name != 'graphicsObjects':
+            template[name] = _frozen(value)
+
+    pos = (properties['mountPoint']['x'], properties['mountPoint']['y'])
+    if parentPos:
+        pos = (pos[0] + parentPos[0], pos[1] + parentPos[1])
+    template['mountPoint'] = MappingProxyType({'x': pos[0], 'y': pos[1]})
+
+    if properties.get('typeLine') == 'trace':
+        template.pop('color', None)
+
+    if 'graphicsObjects' in properties:
+        template['graphicsObjects'] = tuple(componentTemplate(itemProperties, pos)
+                                            for itemProperties in properties['graphicsObjects'])
+    return MappingProxyType(template)
+
+
+def createGraphicsObjectByProperties(ogjectProperties, withId=False, template=False):
     import GraphicsItemLine
     import GraphicsItemRect
     import GraphicsItemEllipse
@@ -493,23 +574,23 @@ def createGraphicsObjectByProperties(ogjectProperties, withId=False):
     item = None
     if typeByName(ogjectProperties['type']) == GROUP_TYPE:
         item = GraphicsItemGroup.GraphicsItemGroup()
-        item.setProperties(ogjectProperties, withId)
+        item.setProperties(ogjectProperties, withId, template)
 
     if typeByName(ogjectProperties['type']) == LINE_TYPE:
         item = GraphicsItemLine.GraphicsItemLine()
-        item.setProperties(ogjectProperties, withId)
+        item.setProperties(ogjectProperties, withId, template)
 
     if typeByName(ogjectProperties['type']) == RECT_TYPE:
         item = GraphicsItemRect.GraphicsItemRect()
-        item.setProperties(ogjectProperties, withId)
+        item.setProperties(ogjectProperties, withId, template)
 
     if typeByName(ogjectProperties['type']) == ELLIPSE_TYPE:
         item = GraphicsItemEllipse.GraphicsItemEllipse()
-        item.setProperties(ogjectProperties, withId)
+        item.setProperties(ogjectProperties, withId, template)
 
     if typeByName(ogjectProperties['type']) == TEXT_TYPE:
         item = GraphicsItemText.GraphicsItemText()
-        item.setProperties(ogjectProperties, withId)
+        item.setProperties(ogjectProperties, withId, template)
 
     if typeByName(ogjectProperties['type']) == LINK_TYPE:
         item = GraphicsItemLink.GraphicsItemLink()
@@ -42,6 +42,7 @@ class GraphicsItemGroup(GraphicsItem):
         self.mountPoint = QPointF(0, 0)
         self._prefixName = None
         self._index = 0
+        self._componentName = None  # library component the group was placed from
         self.indexNameLabel = QGraphicsSimpleTextItem()
         self.indexNameLabel.setBrush(QBrush(Qt.black))
         self.indexNameLabel.setZValue(0)
@@ -79,15 +80,30 @@ class GraphicsItemGroup(GraphicsItem):
         return ""
 
 
+    def componentName(self):
+        return self._componentName
+
+
+    def setComponentName(self, name):
+        self._componentName = name
+        if self._scene and hasattr(self._scene, 'componentGroupChanged'):
+            self._scene.componentGroupChanged(self)
+        self.propertiesChanged()
+
+
     def setPrefixName(self, name):
         if self._prefixName != name:
             self._index = 0
         self._prefixName = name
+        if self._scene and hasattr(self._scene, 'componentGroupChanged'):
+            self._scene.componentGroupChanged(self)
+        self.propertiesChanged()
 
 
     def setIndex(self, index):
         self._index = int(index)
         self.updateView()
+        self.propertiesChanged()
 
 
     def updateView(self):
@@ -294,6 +310,8 @@ class GraphicsItemGroup(GraphicsItem):
         if self.prefixName():
             properties['prefixName'] = self.prefixName()
             properties['index'] = self.index()
+        if self.componentName():
+            properties['component'] = self.componentName()
 
         parentComponentGroup = self.parentComponentGroup()
         if parentComponentGroup:
@@ -307,8 +325,11 @@ class GraphicsItemGroup(GraphicsItem):
         return properties
 
 
-    def setProperties(self, properties, setId=False):
-        properties = copy.deepcopy(properties)
+    def setProperties(self, properties, setId=False, template=False):
+        # template: properties made by componentTemplate(), mount points
+        # of new items are already absolute
+        if not template:
+            properties = copy.deepcopy(properties)
         if typeByName(properties['type']) != GROUP_TYPE:
             return
 
@@ -319,6 +340,8 @@ class GraphicsItemGroup(GraphicsItem):
         if 'prefixName' in properties:
             self.setPrefixName(properties['prefixName'])
             self.setIndex(properties['index'])
+        if 'component' in properties:
+            self.setComponentName(properties['component'])
 
         newMountPoint = QPointF(properties['mountPoint']['x'],
                                 properties['mountPoint']['y'])
@@ -338,11 +361,12 @@ class GraphicsItemGroup(GraphicsItem):
                     found = True
                     break
             if not found:
-                itemMountPoint = QPointF(itemProperties['mountPoint']['x'],
-                                         itemProperties['mountPoint']['y'])
-                itemMountPoint += self.pos()
-                itemProperties['mountPoint']['x'] = itemMountPoint.x()
-                itemProperties['mountPoint']['y'] = itemMountPoint.y()
+                if not template:
+                    itemMountPoint = QPointF(itemProperties['mountPoint']['x'],
+                                             itemProperties['mountPoint']['y'])
+                    itemMountPoint += self.pos()
+                    itemProperties['mountPoint']['x'] = itemMountPoint.x()
+                    itemProperties['mountPoint']['y'] = itemMountPoint.y()
 
                 if typeByName(itemProperties['type']) == LINE_TYPE:
                     item = GraphicsItemLine()
@@ -359,7 +383,7 @@ class GraphicsItemGroup(GraphicsItem):
                 if typeByName(itemProperties['type']) == GROUP_TYPE:
                     item = GraphicsItemGroup()
 
-                item.setProperties(itemProperties)
+                item.setProperties(itemProperties, template=template)
                 newItems.append(item)
 
         self.addItems(newItems)
@@ -437,6 +461,7 @@ class GraphicsItemGroup(GraphicsItem):
     def setParentComponentGroup(self, group):
         self._parentComponentGroup = group
         self.updateView()
+        self.propertiesChanged()
 
 
     def parentComponentGroup(self):
@@ -52,6 +52,17 @@ class GraphicsItemLine(GraphicsItem, QGraphicsLineItem):
     def setTypeLine(self, type):
         self._typeLine = type
         self.updateView()
+        self.geometryChanged()
+
+
+    def setPos(self, point):
+        QGraphicsLineItem.setPos(self, point)
+        self.geometryChanged()
+
+
+    def setLine(self, *args):
+        QGraphicsLineItem.setLine(self, *args)
+        self.geometryChanged()
 
 
     def updateView(self):
@@ -88,25 +99,16 @@ class GraphicsItemLine(GraphicsItem, QGraphicsLineItem):
 
 
     def markPointsShow(self):
-        self.markPointsHide()
         if self.parent():
+            self.markPointsHide()
             return
 
-        self.markP1 = QGraphicsRectItem(None)
-        self.scene().addItem(self.markP1)
-        self.markP1.setZValue(0)
-        self.markP1.setPen(QPen(Qt.black, 1, Qt.SolidLine))
-        x1 = self.p1().x() - self.MARK_SIZE / 2
-        y1 = self.p1().y() - self.MARK_SIZE / 2
-        self.markP1.setRect(x1, y1, self.MARK_SIZE, self.MARK_SIZE)
-
-        self.markP2 = QGraphicsRectItem(None)
-        self.scene().addItem(self.markP2)
-        self.markP2.setZValue(0)
-        self.markP2.setPen(QPen(Qt.black, 1, Qt.SolidLine))
-        x1 = self.p2().x() - self.MARK_SIZE / 2
-        y1 = self.p2().y() - self.MARK_SIZE / 2
-        self.markP2.setRect(x1, y1, self.MARK_SIZE, self.MARK_SIZE)
+        # shown marks are moved, removing items from big scene is slow
+        if not self.markP1:
+            self.markP1 = self.newMarkPoint()
+            self.markP2 = self.newMarkPoint()
+        self.moveMarkPoint(self.markP1, self.p1())
+        self.moveMarkPoint(self.markP2, self.p2())
 
 
     def markPointsHide(self):
@@ -215,15 +217,16 @@ class GraphicsItemLine(GraphicsItem, QGraphicsLineItem):
         return properties
 
 
-    def setProperties(self, properties, setId=False):
-        properties = copy.deepcopy(properties)
+    def setProperties(self, properties, setId=False, template=False):
+        if not template:
+            properties = copy.deepcopy(properties)
         if typeByName(properties['type']) != LINE_TYPE:
             return
 
         self.setTypeLine(properties['typeLine'])
         if self.typeLine() == 'trace' and 'color' in properties:
             del properties['color']
-        GraphicsItem.setProperties(self, properties, setId)
+        GraphicsItem.setProperties(self, properties, setId, template)
         line = QLineF(QPointF(properties['p1']['x'], properties['p1']['y']),
                       QPointF(properties['p2']['x'], properties['p2']['y']))
         self.setLine(line)
@@ -325,11 +325,23 @@ class Connection():
         return freeId
 
 
+    @staticmethod
+    def reserveId(id):
+        Connection.idList.append(id)
+
+
+    @staticmethod
+    def releaseId(id):
+        if id in Connection.idList:
+            Connection.idList.remove(id)
+
+
     def linkPoints(self):
         return self._linkPoints
 
 
     def remove(self):
+        self._editor.journalConnectionRemove(self)
         if self.id() in Connection.idList:
             Connection.idList.remove(self.id())
         self._id = 0
@@ -45,19 +45,18 @@ class GraphicsItemRect(GraphicsItem, QGraphicsRectItem):
 
 
     def markPointsShow(self):
-        self.markPointsHide()
         if self.parent():
+            self.markPointsHide()
             return
 
-        for point in self.points():
-            markPoint = QGraphicsRectItem(None)
-            self.scene().addItem(markPoint)
-            markPoint.setZValue(0)
-            markPoint.setPen(QPen(Qt.black, 1, Qt.SolidLine))
-            x1 = point.x() - self.MARK_SIZE / 2
-            y1 = point.y() - self.MARK_SIZE / 2
-            markPoint.setRect(x1, y1, self.MARK_SIZE, self.MARK_SIZE)
-            self.markPoints.append(markPoint)
+        # shown marks are moved, removing items from big scene is slow
+        points = self.points()
+        if len(self.markPoints) != len(points):
+            self.markPointsHide()
+            for point in points:
+                self.markPoints.append(self.newMarkPoint())
+        for (markPoint, point) in zip(self.markPoints, points):
+            self.moveMarkPoint(markPoint, point)
 
 
     def markPointsHide(self):
@@ -66,6 +65,16 @@ class GraphicsItemRect(GraphicsItem, QGraphicsRectItem):
         self.markPoints = []
 
 
+    def setPos(self, point):
+        QGraphicsRectItem.setPos(self, point)
+        self.geometryChanged()
+
+
+    def setRect(self, *args):
+        QGraphicsRectItem.setRect(self, *args)
+        self.geometryChanged()
+
+
     def posFromParent(self):
         if not self.parent():
             return QGraphicsRectItem.pos(self)
@@ -210,12 +219,13 @@ class GraphicsItemRect(GraphicsItem, QGraphicsRectItem):
         return properties
 
 
-    def setProperties(self, properties, setId=False):
-        properties = copy.deepcopy(properties)
+    def setProperties(self, properties, setId=False, template=False):
+        if not template:
+            properties = copy.deepcopy(properties)
         if typeByName(properties['type']) != RECT_TYPE:
             return
 
-        GraphicsItem.setProperties(self, properties, setId)
+        GraphicsItem.setProperties(self, properties, setId, template)
         rect = QRectF(0, 0,
                       properties['rectSize']['w'],
                       properties['rectSize']['h'])
@@ -251,13 +251,14 @@ class GraphicsItemText(GraphicsItem, QGraphicsTextItem):
         return properties
 
 
-    def setProperties(self, properties, setId=False):
-        properties = copy.deepcopy(properties)
+    def setProperties(self, properties, setId=False, template=False):
+        if not template:
+            properties = copy.deepcopy(properties)
         if typeByName(properties['type']) != TEXT_TYPE:
             return
 
         self._angle = properties['angle']
-        GraphicsItem.setProperties(self, properties, setId)
+        GraphicsItem.setProperties(self, properties, setId, template)
         self.setRect(QRectF(0, 0,
                             properties['rectSize']['w'],
                             properties['rectSize']['h']))
@@ -132,6 +132,8 @@ class ActionChangeItems(HistoryAction):
 
     def undo(self):
         print("undo ChangeItems")
+        self.scene.resetSelectionItems()
+        self.scene.markChanged(self.items)
         for properties in self.itemsBeforeProperties:
             for item in self.items:
                 if item.id() == properties['id']:
@@ -141,6 +143,7 @@ class ActionChangeItems(HistoryAction):
     def redo(self):
         print("redo ChangeItems")
         self.scene.resetSelectionItems()
+        self.scene.markChanged(self.items)
         for properties in self.itemsAfterProperties:
             for item in self.items:
                 if item.id() == properties['id']:
@@ -272,6 +275,7 @@ class History():
         if not self.changeItemsAction.finish():
             return
 
+        self.scene.markChanged(self.changeItemsAction.items)
         self.historyChanged = True
         self.future = []
 
@@ -329,6 +333,7 @@ class History():
         self.future.append(actions)
         for action in reversed(actions):
             action.undo()
+        self.scene.markChanged()
 
 
     def redo(self):
@@ -339,6 +344,7 @@ class History():
         self.history.append(actions)
         for action in reversed(actions):
             action.redo()
+        self.scene.markChanged()
 
 
     def __str__(self):
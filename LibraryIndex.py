@@ -0,0 +1,335 @@
+"""
+ * Component library index
+ *    Keeps name, prefix, texts, modification time and size of each component
+ *    definition, offset and image size of its thumbnail in one thumbnails
+ *    file, so startup doesn't parse every '.ec' and open every '.png'
+ *    file.
+ *    Only changed components are read again on update.
+ *    Libraries are directories or zip archives of '.ec' and '.png' files,
+ *    archive members are read on demand through its central directory,
+ *    not changed archive is not opened at all.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, json, struct, zipfile
+import ProjectFile
+
+
+INDEX_VERSION = 4
+
+
+def fileStamp(fileName):
+    try:
+        st = os.stat(fileName)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def pngSize(data):
+    # image size from PNG IHDR chunk, without decoding
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        return None
+    return list(struct.unpack('>II', data[16:24]))
+
+
+def componentTexts(properties):
+    texts = []
+    for itemProperties in properties.get('graphicsObjects', []):
+        if itemProperties.get('type') == 'text' and itemProperties.get('text'):
+            texts.append(itemProperties['text'])
+        texts += componentTexts(itemProperties)
+    return texts
+
+
+def openLibrary(path):
+    if path.lower().endswith('.zip'):
+        return ZipLibrary(path)
+    return DirectoryLibrary(path)
+
+
+class DirectoryLibrary():
+
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+
+
+    def path(self):
+        return self._path
+
+
+    def stamp(self):
+        # directory content has to be listed on each update
+        return None
+
+
+    def fileName(self, name, extension):
+        return "%s/%s%s" % (self._path, name, extension)
+
+
+    def components(self):
+        # {name: (definition stamp, thumbnail stamp)}
+        if not os.path.isdir(self._path):
+            return {}
+        stamps = {}
+        for entry in os.scandir(self._path):
+            if entry.name.endswith('.ec') or entry.name.endswith('.png'):
+                st = entry.stat()
+                stamps[entry.name] = [st.st_mtime_ns, st.st_size]
+
+        components = {}
+        for fileName in stamps:
+            (name, extension) = os.path.splitext(fileName)
+            if extension == '.ec':
+                components[name] = (stamps[fileName], stamps.get(name + '.png'))
+        return components
+
+
+    def read(self, name, extension):
+        with open(self.fileName(name, extension), 'rb') as file:
+            return file.read()
+
+
+
+class ZipLibrary():
+
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        self._zip = None
+        self._zipStamp = None
+        self._members = None  # {file name: ZipInfo}
+
+
+    def path(self):
+        return self._path
+
+
+    def stamp(self):
+        return fileStamp(self._path)
+
+
+    def fileName(self, name, extension):
+        # members are not watched separately
+        return None
+
+
+    def members(self):
+        # archive is opened again when it was changed
+        stamp = self.stamp()
+        if self._zip and stamp == self._zipStamp:
+            return self._members
+        self.close()
+        self._members = {}
+        if stamp is None:
+            return self._members
+        try:
+            self._zip = zipfile.ZipFile(self._path)
+        except (OSError, zipfile.BadZipFile) as e:
+            print("can't open component library %s: %s" % (self._path, e))
+            return self._members
+        self._zipStamp = stamp
+        for info in self._zip.infolist():
+            fileName = os.path.basename(info.filename)
+            if fileName.endswith('.ec') or fileName.endswith('.png'):
+                self._members.setdefault(fileName, info)
+        return self._members
+
+
+    def components(self):
+        # member stamps are taken from central directory
+        members = self.members()
+        components = {}
+        for fileName in members:
+            (name, extension) = os.path.splitext(fileName)
+            if extension != '.ec':
+                continue
+            info = members[fileName]
+            pngStamp = None
+            if name + '.png' in members:
+                pngInfo = members[name + '.png']
+                pngStamp = [pngInfo.CRC, pngInfo.file_size]
+            components[name] = ([info.CRC, info.file_size], pngStamp)
+        return components
+
+
+    def read(self, name, extension):
+        members = self.members()
+        if name + extension not in members:
+            raise OSError("no %s%s in %s" % (name, extension, self._path))
+        return self._zip.read(members[name + extension])
+
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+        self._zip = None
+        self._members = None
+
+
+
+class LibraryIndex():
+
+
+    def __init__(self, indexFileName):
+        self._indexFileName = indexFileName
+        self._thumbnailsFileName = indexFileName + '.thumbnails'
+        self._libraries = {}  # library stamp by library path
+        self._entries = {}  # by library path and component name
+        self._thumbnails = None
+        self.load()
+
+
+    def load(self):
+        if not os.path.isfile(self._indexFileName):
+            return
+        try:
+            with open(self._indexFileName, 'r') as file:
+                index = json.loads(file.read())
+        except ValueError:
+            print("bad library index %s" % self._indexFileName)
+            return
+        if index.get('version') != INDEX_VERSION:
+            return
+        self._libraries = index['libraries']
+        self._entries = index['components']
+
+
+    def thumbnails(self):
+        if self._thumbnails is None:
+            self._thumbnails = b''
+            if os.path.isfile(self._thumbnailsFileName):
+                with open(self._thumbnailsFileName, 'rb') as file:
+                    self._thumbnails = file.read()
+        return self._thumbnails
+
+
+    def thumbnail(self, entry):
+        if entry['thumbnailOffset'] is None:
+            return None
+        offset = entry['thumbnailOffset']
+        return self.thumbnails()[offset:offset + entry['thumbnailSize']]
+
+
+    def update(self, libraries):
+        # returns index entries of components sorted by name,
+        # component of earlier library hides the same named ones of later
+        oldEntries = {}
+        for (key, entry) in self._entries.items():
+            oldEntries.setdefault(entry['library'], {})[key] = entry
+
+        entries = {}
+        libraryStamps = {}
+        libraryEntries = []
+        changed = 0
+        for library in libraries:
+            path = library.path()
+            stamp = library.stamp()
+            libraryStamps[path] = stamp
+            if stamp is not None and self._libraries.get(path) == stamp:
+                libraryEntries.append(list(oldEntries.get(path, {}).values()))
+                entries.update(oldEntries.get(path, {}))
+                continue
+
+            found = []
+            components = library.components()
+            for name in sorted(components):
+                (stamp, pngStamp) = components[name]
+                key = "%s/%s" % (path, name)
+                entry = self._entries.get(key)
+                if (not entry or entry['stamp'] != stamp or
+                    entry['pngStamp'] != pngStamp):
+                    changed += 1
+                    entry = self.readEntry(library, name, stamp, pngStamp)
+                entries[key] = entry
+                found.append(entry)
+            libraryEntries.append(found)
+
+        removed = len(set(self._entries) - set(entries))
+        if changed or removed or libraryStamps != self._libraries:
+            print("library index: %d changed, %d removed components" % (
+                  changed, removed))
+            self.save(entries, libraryStamps)
+
+        result = {}
+        for found in libraryEntries:
+            for entry in found:
+                result.setdefault(entry['name'], entry)
+        return [result[name] for name in sorted(result)]
+
+
+    def readEntry(self, library, name, stamp, pngStamp):
+        prefixName = ""
+        texts = []
+        try:
+            properties = json.loads(library.read(name, '.ec').decode('utf-8'))
+            prefixName = properties.get('prefixName') or ""
+            texts = componentTexts(properties)
+        except (OSError, ValueError):
+            print("error loading component %s" % name)
+
+        thumbnail = None
+        thumbnailSize = None
+        if pngStamp:
+            thumbnail = library.read(name, '.png')
+            thumbnailSize = pngSize(thumbnail)
+        return {'name': name,
+                'library': library.path(),
+                'prefixName': prefixName,
+                'texts': texts,
+                'stamp': stamp,
+                'pngStamp': pngStamp,
+                'thumbnail': thumbnail,
+                'imageSize': thumbnailSize}
+
+
+    def save(self, entries, libraryStamps):
+        # thumbnails file is rebuilt with all thumbnails
+        thumbnails = []
+        offset = 0
+        for entry in entries.values():
+            if 'thumbnail' in entry:
+                data = entry.pop('thumbnail')
+            else:
+                data = self.thumbnail(entry)
+            entry['thumbnailOffset'] = None
+            entry['thumbnailSize'] = 0
+            if data is None:
+                continue
+            entry['thumbnailOffset'] = offset
+            entry['thumbnailSize'] = len(data)
+            thumbnails.append(data)
+            offset += len(data)
+
+        self._entries = entries
+        self._libraries = libraryStamps
+        self._thumbnails = b''.join(thumbnails)
+        try:
+            ProjectFile.writeFileAtomic(self._thumbnailsFileName, self._thumbnails)
+            index = {'version': INDEX_VERSION,
+                     'libraries': libraryStamps,
+                     'components': entries}
+            ProjectFile.writeFileAtomic(self._indexFileName,
+                                        json.dumps(index).encode('utf-8'))
+        except OSError as e:
+            print("can't save library index %s: %s" % (self._indexFileName, e))
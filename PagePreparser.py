@@ -0,0 +1,105 @@
+"""
+ * Page pre-parsing
+ *    Qt independent checks of page items properties done while project
+ *    is opened. Each page gives compact summary used by not materialized
+ *    page instead of walking items properties on each lookup.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+
+ITEM_REQUIRED_KEYS = {'line': ['typeLine', 'p1', 'p2'],
+                      'group': ['graphicsObjects'],
+                      'rectangle': ['rectSize'],
+                      'ellipse': ['rectSize'],
+                      'link': ['arrowPoint'],
+                      'text': ['angle', 'rectSize', 'text']}
+
+
+def itemError(properties):
+    for key in ['id', 'type', 'name', 'mountPoint']:
+        if key not in properties:
+            return "no '%s' property" % key
+
+    type = properties['type']
+    if type not in ITEM_REQUIRED_KEYS:
+        return "unknown item type '%s'" % type
+    for key in ITEM_REQUIRED_KEYS[type]:
+        if key not in properties:
+            return "%s has no '%s' property" % (type, key)
+
+    if type == 'group':
+        for childProperties in properties['graphicsObjects']:
+            error = itemError(childProperties)
+            if error:
+                return "group child %s" % error
+    return None
+
+
+def preparsePage(itemsData):
+    # summary:
+    #   'invalid'    - [[item position, error message], ...]
+    #   'ids'        - ids of valid top level items
+    #   'lastId'     - max top level id
+    #   'components' - groups with prefixName, parent component or
+    #                  library component name on any nesting level:
+    #                  {'id', 'prefixName', 'index', 'topLevel',
+    #                   'parentComponentId', 'component', 'rootId'}
+    invalid = []
+    ids = []
+    components = []
+
+    def addComponents(itemsData, rootId):
+        for properties in itemsData:
+            if properties['type'] != 'group':
+                continue
+            topLevel = rootId is None
+            if topLevel:
+                rootId = properties['id']
+            if (properties.get('prefixName') or
+                'parentComponentId' in properties or
+                properties.get('component')):
+                components.append({'id': properties['id'],
+                                   'prefixName': properties.get('prefixName', ''),
+                                   'index': properties.get('index', 0),
+                                   'topLevel': topLevel,
+                                   'parentComponentId': properties.get('parentComponentId'),
+                                   'component': properties.get('component'),
+                                   'rootId': rootId})
+            addComponents(properties['graphicsObjects'], rootId)
+
+    for pos in range(len(itemsData)):
+        properties = itemsData[pos]
+        error = itemError(properties)
+        if error:
+            invalid.append([pos, error])
+            continue
+        ids.append(properties['id'])
+        addComponents([properties], None)
+
+    lastId = 0
+    if ids:
+        lastId = max(ids)
+    return {'invalid': invalid,
+            'ids': ids,
+            'lastId': lastId,
+            'components': components}
+
@@ -0,0 +1,449 @@
+"""
+ * Project file formats
+ *    '.es'  - indented JSON text
+ *    '.esb' - compact binary container with the same content
+ *    '.es.gz', '.es.xz' - gzip or xz compressed '.es', compression
+ *                         is detected by magic bytes on loading
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, json, struct, tempfile, gzip, lzma
+
+
+PROJECT_EXTENSIONS = ['.es', '.esb', '.es.gz', '.es.xz']
+BINARY_MAGIC = b'ESB\x00'
+BINARY_VERSION = 1
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+GZIP_LEVEL = 6
+XZ_PRESET = 3
+
+# binary value tags
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT32 = 3
+TAG_INT64 = 4
+TAG_BIGINT = 5
+TAG_FLOAT = 6
+TAG_STR16 = 7
+TAG_STR32 = 8
+TAG_LIST = 9
+TAG_DICT = 10
+TAG_POINT = 11  # {'x', 'y'}: mountPoint, p1, p2, viewCenter, arrowPoint
+TAG_SIZE = 12  # {'w', 'h'}: rectSize
+TAG_RGB = 13  # {'R', 'G', 'B'}
+TAG_RGBA = 14  # {'R', 'G', 'B', 'A'}
+
+# number kinds packed into point flags
+NUM_INT = 0
+NUM_FLOAT = 1
+
+MAX_EXACT_DOUBLE = 2 ** 53
+
+_byte = struct.Struct('<B')
+_uint16 = struct.Struct('<H')
+_uint32 = struct.Struct('<I')
+_int32 = struct.Struct('<i')
+_int64 = struct.Struct('<q')
+_double = struct.Struct('<d')
+_pair = struct.Struct('<Bdd')
+_rgb = struct.Struct('<BBB')
+_rgba = struct.Struct('<BBBB')
+
+_pairKeys = {TAG_POINT: ('x', 'y'),
+             TAG_SIZE: ('w', 'h')}
+
+
+def projectExtension(fileName):
+    for extension in sorted(PROJECT_EXTENSIONS, key=len, reverse=True):
+        if fileName.endswith(extension):
+            return extension
+    return None
+
+
+def projectBaseName(fileName):
+    # file name without project extension
+    extension = projectExtension(fileName)
+    if extension:
+        return fileName[:-len(extension)]
+    return fileName
+
+
+def projectCompression(fileName):
+    extension = os.path.splitext(fileName)[1]
+    if extension == '.gz':
+        return 'gz'
+    if extension == '.xz':
+        return 'xz'
+    return None
+
+
+def projectFormat(fileName):
+    if projectCompression(fileName):
+        fileName = os.path.splitext(fileName)[0]
+    if os.path.splitext(fileName)[1] == '.esb':
+        return 'esb'
+    return 'es'
+
+
+def encodeJson(data):
+    return json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
+
+
+def encodePageFragment(pageData):
+    # page JSON text indented as item of project 'pages' list
+    return encodeJson(pageData).replace('\n', '\n    ')
+
+
+def joinPageFragments(project, fragments):
+    # splice page fragments into project JSON, the result is the same
+    # as encodeJson(project)
+    skeleton = dict(project)
+    skeleton['pages'] = []
+    jsonText = encodeJson(skeleton)
+    if not len(fragments):
+        return jsonText
+
+    emptyPages = '\n  "pages": []'
+    pos = jsonText.rindex(emptyPages) + len(emptyPages) - 1
+    return (jsonText[:pos] +
+            '\n    ' + ',\n    '.join(fragments) + '\n  ' +
+            jsonText[pos:])
+
+
+def encodeProject(project, format='es', progress=None, pageFragments=None):
+    # pageFragments: list of cached page fragments or None for each page,
+    # it is filled by fragments encoded here
+    if format == 'esb':
+        content = encodeBinary(project)
+        if progress:
+            progress(1, 1)
+        return content
+
+    pagesData = project['pages']
+    fragments = []
+    for pageData in pagesData:
+        fragment = None
+        if pageFragments:
+            fragment = pageFragments[len(fragments)]
+        if fragment is None:
+            fragment = encodePageFragment(pageData)
+            if pageFragments:
+                pageFragments[len(fragments)] = fragment
+        fragments.append(fragment)
+        if progress:
+            progress(len(fragments), len(pagesData))
+    return joinPageFragments(project, fragments).encode('utf-8')
+
+
+def decodeProject(content):
+    if content[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+        return decodeBinary(content)
+    return json.loads(content.decode('utf-8'))
+
+
+def openProjectStream(fileName):
+    # compressed file is decompressed while it is read from the stream
+    file = open(fileName, "rb")
+    magic = file.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)]
+    if magic.startswith(GZIP_MAGIC):
+        file.close()
+        return gzip.open(fileName, "rb")
+    if magic.startswith(XZ_MAGIC):
+        file.close()
+        return lzma.open(fileName, "rb")
+    return file
+
+
+def loadProject(fileName):
+    with openProjectStream(fileName) as stream:
+        magic = stream.peek(len(BINARY_MAGIC))[:len(BINARY_MAGIC)]
+        if magic == BINARY_MAGIC:
+            return decodeBinary(stream.read())
+        return json.load(stream)
+
+
+def compressContent(content, compression):
+    if compression == 'gz':
+        return gzip.compress(content, GZIP_LEVEL)
+    if compression == 'xz':
+        return lzma.compress(content, preset=XZ_PRESET)
+    return content
+
+
+def writeFileAtomic(fileName, content):
+    # write into temporary file near target and rename it into place,
+    # so readers see either old or new complete file
+    fileDirName = os.path.dirname(os.path.abspath(fileName))
+    (fd, tempFileName) = tempfile.mkstemp(dir=fileDirName,
+                                          prefix=".%s." % os.path.basename(fileName),
+                                          suffix=".tmp")
+    try:
+        file = os.fdopen(fd, "wb")
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+        if os.path.exists(fileName):
+            os.chmod(tempFileName, os.stat(fileName).st_mode & 0o7777)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tempFileName, 0o666 & ~umask)
+        os.replace(tempFileName, fileName)
+    except:
+        if os.path.exists(tempFileName):
+            os.remove(tempFileName)
+        raise
+
+
+def saveProject(fileName, project, format=None, progress=None,
+                pageFragments=None):
+    if not format:
+        format = projectFormat(fileName)
+    content = encodeProject(project, format, progress, pageFragments)
+    writeFileAtomic(fileName, compressContent(content,
+                                              projectCompression(fileName)))
+    return content
+
+
+def _isPackableNumber(value):
+    if type(value) == int:
+        return -MAX_EXACT_DOUBLE <= value <= MAX_EXACT_DOUBLE
+    return type(value) == float
+
+
+def _isColorComponent(value):
+    return type(value) == int and 0 <= value <= 255
+
+
+def _packedTag(value):
+    size = len(value)
+    if size == 2:
+        for tag, (k1, k2) in _pairKeys.items():
+            if (k1 in value and k2 in value and
+                _isPackableNumber(value[k1]) and
+                _isPackableNumber(value[k2])):
+                return tag
+        return None
+
+    if size == 3 or size == 4:
+        keys = 'RGB' if size == 3 else 'RGBA'
+        for key in keys:
+            if not key in value or not _isColorComponent(value[key]):
+                return None
+        return TAG_RGB if size == 3 else TAG_RGBA
+    return None
+
+
+class _BinaryEncoder():
+    def __init__(self):
+        self.strings = {}
+        self.stringsList = []
+        self.parts = []
+
+
+    def stringIndex(self, string):
+        index = self.strings.get(string)
+        if index is None:
+            index = len(self.stringsList)
+            self.strings[string] = index
+            self.stringsList.append(string)
+        return index
+
+
+    def encodeValue(self, value):
+        parts = self.parts
+        valueType = type(value)
+
+        if value is None:
+            parts.append(_byte.pack(TAG_NONE))
+        elif valueType == bool:
+            parts.append(_byte.pack(TAG_TRUE if value else TAG_FALSE))
+        elif valueType == int:
+            if -0x80000000 <= value <= 0x7fffffff:
+                parts.append(_byte.pack(TAG_INT32) + _int32.pack(value))
+            elif -0x8000000000000000 <= value <= 0x7fffffffffffffff:
+                parts.append(_byte.pack(TAG_INT64) + _int64.pack(value))
+            else:
+                parts.append(_byte.pack(TAG_BIGINT))
+                self.encodeValue(str(value))
+        elif valueType == float:
+            parts.append(_byte.pack(TAG_FLOAT) + _double.pack(value))
+        elif valueType == str:
+            index = self.stringIndex(value)
+            if index <= 0xffff:
+                parts.append(_byte.pack(TAG_STR16) + _uint16.pack(index))
+            else:
+                parts.append(_byte.pack(TAG_STR32) + _uint32.pack(index))
+        elif valueType == list or valueType == tuple:
+            parts.append(_byte.pack(TAG_LIST) + _uint32.pack(len(value)))
+            for item in value:
+                self.encodeValue(item)
+        elif valueType == dict:
+            tag = _packedTag(value)
+            if tag == TAG_POINT or tag == TAG_SIZE:
+                (k1, k2) = _pairKeys[tag]
+                v1 = value[k1]
+                v2 = value[k2]
+                flags = 0
+                if type(v1) == float:
+                    flags |= NUM_FLOAT
+                if type(v2) == float:
+                    flags |= NUM_FLOAT << 1
+                parts.append(_byte.pack(tag) + _pair.pack(flags, v1, v2))
+            elif tag == TAG_RGB:
+                parts.append(_byte.pack(tag) +
+                             _rgb.pack(value['R'], value['G'], value['B']))
+            elif tag == TAG_RGBA:
+                parts.append(_byte.pack(tag) +
+                             _rgba.pack(value['R'], value['G'],
+                                        value['B'], value['A']))
+            else:
+                parts.append(_byte.pack(TAG_DICT) + _uint32.pack(len(value)))
+                for key, item in value.items():
+                    if type(key) != str:
+                        raise ValueError("only string keys are supported")
+                    parts.append(_uint32.pack(self.stringIndex(key)))
+                    self.encodeValue(item)
+        else:
+            raise ValueError("can't encode value of type %s" % valueType.__name__)
+
+
+    def content(self):
+        header = [BINARY_MAGIC,
+                  _byte.pack(BINARY_VERSION),
+                  _uint32.pack(len(self.stringsList))]
+        for string in self.stringsList:
+            data = string.encode('utf-8')
+            header.append(_uint32.pack(len(data)))
+            header.append(data)
+        return b''.join(header + self.parts)
+
+
+def encodeBinary(project):
+    encoder = _BinaryEncoder()
+    encoder.encodeValue(project)
+    return encoder.content()
+
+
+def decodeBinary(content):
+    content = memoryview(content)
+    if bytes(content[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise ValueError("not a binary project file")
+    offset = len(BINARY_MAGIC)
+    version = content[offset]
+    if version > BINARY_VERSION:
+        raise ValueError("unsupported binary project version %d" % version)
+    offset += 1
+
+    (stringsCount,) = _uint32.unpack_from(content, offset)
+    offset += 4
+    strings = []
+    for i in range(stringsCount):
+        (size,) = _uint32.unpack_from(content, offset)
+        offset += 4
+        strings.append(str(content[offset:offset + size], 'utf-8'))
+        offset += size
+
+    int32Unpack = _int32.unpack_from
+    uint16Unpack = _uint16.unpack_from
+    uint32Unpack = _uint32.unpack_from
+    doubleUnpack = _double.unpack_from
+    pairUnpack = _pair.unpack_from
+    rgbUnpack = _rgb.unpack_from
+    rgbaUnpack = _rgba.unpack_from
+
+    def decodeValue(offset):
+        tag = content[offset]
+        offset += 1
+
+        if tag == TAG_STR16:
+            return strings[uint16Unpack(content, offset)[0]], offset + 2
+
+        if tag == TAG_POINT or tag == TAG_SIZE:
+            (flags, v1, v2) = pairUnpack(content, offset)
+            if not flags & NUM_FLOAT:
+                v1 = int(v1)
+            if not flags & (NUM_FLOAT << 1):
+                v2 = int(v2)
+            (k1, k2) = _pairKeys[tag]
+            return {k1: v1, k2: v2}, offset + 17
+
+        if tag == TAG_INT32:
+            return int32Unpack(content, offset)[0], offset + 4
+
+        if tag == TAG_DICT:
+            (size,) = uint32Unpack(content, offset)
+            offset += 4
+            value = {}
+            for i in range(size):
+                key = strings[uint32Unpack(content, offset)[0]]
+                (value[key], offset) = decodeValue(offset + 4)
+            return value, offset
+
+        if tag == TAG_LIST:
+            (size,) = uint32Unpack(content, offset)
+            offset += 4
+            value = []
+            for i in range(size):
+                (item, offset) = decodeValue(offset)
+                value.append(item)
+            return value, offset
+
+        if tag == TAG_RGB:
+            (r, g, b) = rgbUnpack(content, offset)
+            return {'R': r, 'G': g, 'B': b}, offset + 3
+
+        if tag == TAG_RGBA:
+            (r, g, b, a) = rgbaUnpack(content, offset)
+            return {'R': r, 'G': g, 'B': b, 'A': a}, offset + 4
+
+        if tag == TAG_FLOAT:
+            return doubleUnpack(content, offset)[0], offset + 8
+
+        if tag == TAG_STR32:
+            return strings[uint32Unpack(content, offset)[0]], offset + 4
+
+        if tag == TAG_NONE:
+            return None, offset
+
+        if tag == TAG_FALSE:
+            return False, offset
+
+        if tag == TAG_TRUE:
+            return True, offset
+
+        if tag == TAG_INT64:
+            return _int64.unpack_from(content, offset)[0], offset + 8
+
+        if tag == TAG_BIGINT:
+            (value, offset) = decodeValue(offset)
+            return int(value), offset
+
+        raise ValueError("unknown binary tag %d at offset %d" % (tag, offset - 1))
+
+    (project, offset) = decodeValue(offset)
+    if offset != len(content):
+        raise ValueError("unexpected data after end of project")
+    return project
@@ -0,0 +1,324 @@
+"""
+ * Project edit journal
+ *    Each committed edit is appended to '<project>.journal' as one JSON line
+ *    with changed items only. Journal is replayed on top of the project file
+ *    after a crash and restarted after each successful save.
+ *
+ *    First line is a header: project file size and mtime at journal start
+ *    and journal keys of the project file pages. Other lines are records:
+ *      "order": [[pageKey, pageName], ...] - pages after adding, removing,
+ *                                            moving or renaming
+ *      "pages": [{"page": pageKey, "set": [itemProperties, ...],
+ *                 "removed": [itemId, ...]}, ...]
+ *      "connections": {"set": [connProperties, ...],
+ *                      "removed": [connId, ...]}
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+
+import os, json
+import ProjectFile
+
+
+JOURNAL_VERSION = 1
+JOURNAL_COMPACT_RECORDS = 256
+
+
+def journalFileName(projectFileName):
+    return projectFileName + '.journal'
+
+
+def projectFileStamp(fileName):
+    st = os.stat(fileName)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+
+def _encodeLine(data):
+    return (json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def _foldDelta(delta, setList, removedList, key='id'):
+    for id in removedList:
+        delta['set'].pop(id, None)
+        if id not in delta['removed']:
+            delta['removed'].append(id)
+    for properties in setList:
+        delta['set'][properties[key]] = properties
+
+
+def foldRecords(records):
+    # merge sequence of records into one record with the same result
+    order = None
+    pages = {}
+    connections = {'set': {}, 'removed': []}
+    for record in records:
+        if 'order' in record:
+            order = record['order']
+        for pageDelta in record.get('pages', []):
+            key = pageDelta['page']
+            if key not in pages:
+                pages[key] = {'set': {}, 'removed': []}
+            _foldDelta(pages[key], pageDelta['set'], pageDelta['removed'])
+        if 'connections' in record:
+            _foldDelta(connections,
+                       record['connections']['set'],
+                       record['connections']['removed'])
+
+    folded = {}
+    if order is not None:
+        folded['order'] = order
+    pagesList = []
+    for key in pages:
+        pagesList.append({'page': key,
+                          'set': list(pages[key]['set'].values()),
+                          'removed': pages[key]['removed']})
+    if pagesList:
+        folded['pages'] = pagesList
+    if connections['set'] or connections['removed']:
+        folded['connections'] = {'set': list(connections['set'].values()),
+                                 'removed': connections['removed']}
+    return folded
+
+
+def _applyDelta(dataList, setList, removedList):
+    removed = set(removedList)
+    result = []
+    for properties in dataList:
+        if properties['id'] not in removed:
+            result.append(properties)
+
+    index = {}
+    for i in range(len(result)):
+        index[result[i]['id']] = i
+    for properties in setList:
+        id = properties['id']
+        if id in index:
+            result[index[id]] = properties
+            continue
+        index[id] = len(result)
+        result.append(properties)
+    return result
+
+
+def applyJournal(project, header, records):
+    # replay records on project data loaded from file,
+    # returns journal keys of resulting pages
+    pagesData = project['pages']
+    keys = header['pages']
+    if len(keys) != len(pagesData):
+        raise ValueError("journal doesn't match project pages")
+
+    pagesByKey = {}
+    for (key, pageData) in zip(keys, pagesData):
+        pagesByKey[key] = pageData
+    order = list(keys)
+
+    for record in records:
+        if 'order' in record:
+            order = []
+            for (key, name) in record['order']:
+                if key not in pagesByKey:
+                    pagesByKey[key] = {"num": 0, "name": name, "items": []}
+                pagesByKey[key]['name'] = name
+                order.append(key)
+
+        for pageDelta in record.get('pages', []):
+            pageData = pagesByKey.get(pageDelta['page'])
+            if not pageData:
+                continue
+            pageData['items'] = _applyDelta(pageData['items'],
+                                            pageDelta['set'],
+                                            pageDelta['removed'])
+
+        if 'connections' in record:
+            project['connections'] = _applyDelta(project['connections'],
+                                                 record['connections']['set'],
+                                                 record['connections']['removed'])
+
+    project['pages'] = []
+    num = 0
+    for key in order:
+        num += 1
+        pageData = pagesByKey[key]
+        pageData['num'] = num
+        project['pages'].append(pageData)
+    return order
+
+
+def lastPageKey(header, records):
+    lastKey = 0
+    for key in header['pages']:
+        lastKey = max(lastKey, key)
+    for record in records:
+        for (key, name) in record.get('order', []):
+            lastKey = max(lastKey, key)
+    return lastKey
+
+
+def loadJournal(projectFileName):
+    # returns (header, records) of journal left for project file or None
+    # if there are no edits to recover
+    fileName = journalFileName(projectFileName)
+    if not os.path.isfile(fileName):
+        return None
+
+    with open(fileName, 'rb') as file:
+        lines = file.read().split(b'\n')
+
+    try:
+        header = json.loads(lines[0].decode('utf-8'))
+    except ValueError:
+        return None
+
+    if header.get('journal') != JOURNAL_VERSION:
+        return None
+    stamp = projectFileStamp(projectFileName)
+    if header['size'] != stamp['size'] or header['mtime'] != stamp['mtime']:
+        # project was saved after journal had been written
+        return None
+
+    records = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line.decode('utf-8')))
+        except ValueError:
+            # record was interrupted by crash
+            break
+    if not records:
+        # nothing was edited after project had been saved
+        return None
+    return (header, records)
+
+
+class ProjectJournal():
+
+
+    def __init__(self):
+        self._fileName = None
+        self._file = None
+        self._header = None
+        self._records = []
+        self._savedCount = 0  # records included into running save
+        self._savedKeys = None
+
+
+    def isOpen(self):
+        return self._file is not None
+
+
+    def recordsCount(self):
+        return len(self._records)
+
+
+    def resume(self, projectFileName, header, records):
+        # continue journal replayed on open
+        self.close()
+        self._fileName = journalFileName(projectFileName)
+        self._header = header
+        self._records = list(records)
+        self._savedCount = 0
+        self._savedKeys = None
+        self._rewrite()
+
+
+    def restart(self, projectFileName):
+        # project file was saved: records included into it are dropped
+        records = self._records[self._savedCount:]
+
+        self.close()
+        fileName = journalFileName(projectFileName)
+        if (self._fileName and self._fileName != fileName and
+            os.path.isfile(self._fileName)):
+            os.remove(self._fileName)
+
+        self._fileName = fileName
+        self._header = {'journal': JOURNAL_VERSION,
+                        'pages': self._savedKeys}
+        self._header.update(projectFileStamp(projectFileName))
+        self._records = records
+        self._savedCount = 0
+        self._savedKeys = None
+        self._rewrite()
+
+
+    def markSaved(self, pageKeys):
+        # project snapshot with pages pageKeys was passed to saving
+        self._savedCount = len(self._records)
+        self._savedKeys = pageKeys
+
+
+    def append(self, record):
+        if not self.isOpen():
+            return
+        self._records.append(record)
+        self._file.write(_encodeLine(record))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        if len(self._records) >= JOURNAL_COMPACT_RECORDS:
+            self.compact()
+
+
+    def compact(self):
+        # records of running save and newer ones are folded separately
+        records = []
+        savedRecord = foldRecords(self._records[:self._savedCount])
+        if savedRecord:
+            records.append(savedRecord)
+        newRecord = foldRecords(self._records[self._savedCount:])
+        savedCount = len(records)
+        if newRecord:
+            records.append(newRecord)
+        print("compact journal %s: %d records to %d" % (self._fileName,
+                                                        len(self._records),
+                                                        len(records)))
+        self._records = records
+        self._savedCount = savedCount
+        self.close()
+        self._rewrite()
+
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+
+
+    def discard(self):
+        self.close()
+        if self._fileName and os.path.isfile(self._fileName):
+            os.remove(self._fileName)
+        self._fileName = None
+        self._header = None
+        self._records = []
+        self._savedCount = 0
+        self._savedKeys = None
+
+
+    def _rewrite(self):
+        content = _encodeLine(self._header)
+        for record in self._records:
+            content += _encodeLine(record)
+        ProjectFile.writeFileAtomic(self._fileName, content)
+        self._file = open(self._fileName, 'ab')
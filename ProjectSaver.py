@@ -0,0 +1,160 @@
+"""
+ * Background project saving
+ *    GUI thread passes properties snapshot of the project, encoding and
+ *    writing are done in worker thread. Saves requested while writing
+ *    are coalesced, only the last one is written. Saved content is
+ *    added into the project backup store when backup is requested.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+from PyQt5.QtCore import QObject, pyqtSignal
+import threading
+import os
+import ProjectFile
+import ComponentReferences
+from BackupStore import *
+
+
+class ProjectSaver(QObject):
+    progress = pyqtSignal(str, int)  # fileName, percent
+    finished = pyqtSignal(str, str)  # fileName, error message or ""
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pendingJob = None
+
+
+    def save(self, fileName, project, backup=None, pagesCache=None,
+             componentTemplates=None):
+        # backup: None or {'dirName', 'keepAllInterval', 'keepDays'}
+        # pagesCache: PageWidget serialization cache of each project page,
+        # encoded page fragments are stored back into it
+        # componentTemplates: library components properties by name,
+        # placed components are saved as references to them
+        job = {'fileName': fileName,
+               'project': project,
+               'backup': backup,
+               'pagesCache': pagesCache,
+               'componentTemplates': componentTemplates}
+
+        with self._lock:
+            if self._thread:
+                # coalesce with save which is waiting for current writing
+                pendingJob = self._pendingJob
+                if (pendingJob and not backup and
+                    pendingJob['fileName'] == fileName):
+                    job['backup'] = pendingJob['backup']
+                self._pendingJob = job
+                return
+
+            self._thread = threading.Thread(target=self._run, args=(job,),
+                                            name="ProjectSaver")
+            self._thread.start()
+
+
+    def isBusy(self):
+        with self._lock:
+            return self._thread is not None
+
+
+    def wait(self):
+        with self._lock:
+            thread = self._thread
+        if thread:
+            thread.join()
+
+
+    def _run(self, job):
+        while job:
+            error = ""
+            try:
+                self._write(job)
+            except Exception as e:
+                error = str(e)
+            fileName = job['fileName']
+
+            # saver is not busy anymore when last finished job is reported
+            with self._lock:
+                job = self._pendingJob
+                self._pendingJob = None
+                if not job:
+                    self._thread = None
+            self.finished.emit(fileName, error)
+
+
+    def _write(self, job):
+        fileName = job['fileName']
+        backup = job['backup']
+        store = None
+        if backup:
+            store = BackupStore(backup['dirName'])
+            if not store.revisions() and os.path.isfile(fileName):
+                # keep file state before first saving by editor
+                self._backup(store, fileName, None)
+
+        def progress(done, total):
+            self.progress.emit(fileName, int(done * 100 / total))
+
+        pagesCache = job['pagesCache']
+        pageFragments = None
+        if pagesCache:
+            pageFragments = []
+            for cache in pagesCache:
+                pageFragments.append(cache['fragment'])
+
+        project = job['project']
+        if job['componentTemplates'] is not None:
+            project = ComponentReferences.packProject(project,
+                                                      job['componentTemplates'],
+                                                      pageFragments)
+
+        content = ProjectFile.saveProject(fileName, project,
+                                          progress=progress,
+                                          pageFragments=pageFragments)
+
+        if pagesCache:
+            for (cache, fragment) in zip(pagesCache, pageFragments):
+                cache['fragment'] = fragment
+
+        if store:
+            self._backup(store, fileName, content,
+                         job['project']['header']['rev'])
+            try:
+                store.applyRetention(backup['keepAllInterval'],
+                                     backup['keepDays'])
+            except OSError as e:
+                print("can't apply backup retention: %s" % e)
+
+
+    def _backup(self, store, fileName, content, projectRevision=None):
+        # saved file is valid even if backup failed
+        try:
+            if content is None:
+                # compressed file is stored decompressed for better deduplication
+                with ProjectFile.openProjectStream(fileName) as stream:
+                    content = stream.read()
+            extension = '.' + ProjectFile.projectFormat(fileName)
+            store.addRevision(content, extension, projectRevision)
+        except Exception as e:
+            print("can't backup project %s: %s" % (fileName, e))
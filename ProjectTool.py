@@ -0,0 +1,263 @@
+"""
+ * Headless project tool
+ *    Commands run without Qt:
+ *      convert  <source> <destination> [--references]
+ *      validate [-j jobs] <file> ...
+ *      stats    [-j jobs] <file> ...
+ *    validate exits with status 1 if any project has problems.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, sys, json, argparse
+from concurrent.futures import ProcessPoolExecutor
+import ProjectFile
+import ComponentReferences
+from PagePreparser import itemError
+from LibraryIndex import DirectoryLibrary, openLibrary
+from Settings import Settings
+
+
+def editorPath():
+    return os.path.dirname(os.path.realpath(__file__))
+
+
+def libraryTemplates():
+    # components directory hides same named components of other libraries
+    libraries = [DirectoryLibrary("%s/components" % editorPath())]
+    for path in Settings().data()['componentLibraries']:
+        libraries.append(openLibrary(os.path.expanduser(path)))
+
+    templates = {}
+    for library in libraries:
+        for name in library.components():
+            if name not in templates:
+                templates[name] = json.loads(library.read(name, '.ec').decode('utf-8'))
+    return templates
+
+
+def loadProject(fileName):
+    project = ProjectFile.loadProject(fileName)
+    for section in ['header', 'pages', 'connections']:
+        if section not in project:
+            raise ValueError("can't find '%s' section" % section)
+    ComponentReferences.expandProject(project)
+    return project
+
+
+def projectProblems(project):
+    problems = []
+    usedIds = {}
+    groupIds = set()
+    linkIds = set()
+
+    for pageData in project['pages']:
+        for properties in pageData['items']:
+            error = itemError(properties)
+            if error:
+                problems.append("page %d: invalid item %s: %s" % (
+                                pageData['num'], properties.get('id'), error))
+                continue
+
+            id = properties['id']
+            if not id:
+                problems.append("page %d: item with null id" % pageData['num'])
+            elif id in usedIds:
+                problems.append("page %d: duplicate item id %d, "
+                                "first used on page %d" % (pageData['num'], id,
+                                                            usedIds[id]))
+            else:
+                usedIds[id] = pageData['num']
+
+            if properties['type'] == 'group':
+                groupIds.add(id)
+            if properties['type'] == 'link':
+                linkIds.add(id)
+
+    # parentComponentId is resolved only against top level groups
+    for pageData in project['pages']:
+        for properties in pageData['items']:
+            parentId = properties.get('parentComponentId')
+            if parentId is not None and parentId not in groupIds:
+                problems.append("page %d: group %s has missing parent "
+                                "component %d" % (pageData['num'],
+                                                  properties.get('id'),
+                                                  parentId))
+
+    connectionIds = set()
+    connectedLinks = set()
+    for connData in project['connections']:
+        if connData['id'] in connectionIds:
+            problems.append("duplicate connection id %d" % connData['id'])
+        connectionIds.add(connData['id'])
+        for key in ['p1', 'p2']:
+            linkId = connData[key]
+            if linkId not in linkIds:
+                problems.append("connection %d: dangling link point %d" % (
+                                connData['id'], linkId))
+            elif linkId in connectedLinks:
+                problems.append("connection %d: link point %d is already "
+                                "connected" % (connData['id'], linkId))
+            connectedLinks.add(linkId)
+    return problems
+
+
+def projectStats(project):
+    itemsCount = {}
+    def countItems(itemsData):
+        for properties in itemsData:
+            type = properties.get('type')
+            itemsCount[type] = itemsCount.get(type, 0) + 1
+            if type == 'group':
+                countItems(properties.get('graphicsObjects', []))
+
+    components = 0
+    for pageData in project['pages']:
+        countItems(pageData['items'])
+        for properties in pageData['items']:
+            if properties.get('prefixName'):
+                components += 1
+
+    return {'pages': len(project['pages']),
+            'items': itemsCount,
+            'components': components,
+            'connections': len(project['connections'])}
+
+
+def validateFile(fileName):
+    try:
+        return (fileName, projectProblems(loadProject(fileName)))
+    except Exception as e:
+        return (fileName, ["can't load project: %s" % e])
+
+
+def statsFile(fileName):
+    try:
+        stats = projectStats(loadProject(fileName))
+    except Exception as e:
+        return (fileName, None, "can't load project: %s" % e)
+    stats['size'] = os.path.getsize(fileName)
+    return (fileName, stats, None)
+
+
+def mapFiles(func, fileNames, jobs):
+    # each file is loaded in worker process, only results are passed back
+    if jobs == 1 or len(fileNames) < 2:
+        return map(func, fileNames)
+    pool = ProcessPoolExecutor(jobs or None)
+    return pool.map(func, fileNames)
+
+
+def commandValidate(args):
+    failed = 0
+    for (fileName, problems) in mapFiles(validateFile, args.files, args.jobs):
+        if not problems:
+            print("%s: OK" % fileName)
+            continue
+        failed += 1
+        print("%s: %d problems" % (fileName, len(problems)))
+        for problem in problems:
+            print("  %s" % problem)
+    if len(args.files) > 1:
+        print("%d of %d projects have problems" % (failed, len(args.files)))
+    return 1 if failed else 0
+
+
+def commandStats(args):
+    status = 0
+    for (fileName, stats, error) in mapFiles(statsFile, args.files, args.jobs):
+        if error:
+            print("%s: %s" % (fileName, error))
+            status = 1
+            continue
+        items = ", ".join("%s %d" % (type, count)
+                          for (type, count) in sorted(stats['items'].items()))
+        print("%s: %d bytes, %d pages, %d components, %d connections, "
+              "items: %s" % (fileName, stats['size'], stats['pages'],
+                             stats['components'], stats['connections'], items))
+    return status
+
+
+def commandConvert(args):
+    if not ProjectFile.projectExtension(args.destination):
+        print("unknown project format of %s, use one of: %s" % (
+              args.destination, " ".join(ProjectFile.PROJECT_EXTENSIONS)))
+        return 1
+    try:
+        project = loadProject(args.source)
+    except Exception as e:
+        print("%s: can't load project: %s" % (args.source, e))
+        return 1
+
+    if args.references:
+        project = ComponentReferences.packProject(project, libraryTemplates())
+    ProjectFile.saveProject(args.destination, project)
+    print("%s -> %s" % (args.source, args.destination))
+    return 0
+
+
+def commandThumbnails(args):
+    # Qt is loaded only by this command
+    import ThumbnailRenderer
+    failed = ThumbnailRenderer.regenerateThumbnails("%s/components" % editorPath(),
+                                                    args.jobs)
+    return 1 if failed else 0
+
+
+COMMANDS = ['convert', 'validate', 'stats', 'thumbnails']
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="electro.py",
+                                     description="Headless Electro project tool")
+    commands = parser.add_subparsers(dest='command')
+
+    convert = commands.add_parser('convert', help="convert project format, "
+                                  "format is chosen by destination extension")
+    convert.add_argument('source')
+    convert.add_argument('destination')
+    convert.add_argument('--references', action='store_true',
+                         help="save library components as references")
+
+    for (name, help) in [('validate', "check ids, connections and parents"),
+                         ('stats', "print project statistics")]:
+        command = commands.add_parser(name, help=help)
+        command.add_argument('-j', '--jobs', type=int, default=0,
+                             help="parallel jobs, default is CPU count")
+        command.add_argument('files', nargs='+')
+
+    thumbnails = commands.add_parser('thumbnails', help="regenerate thumbnails "
+                                     "of all components in components directory")
+    thumbnails.add_argument('-j', '--jobs', type=int, default=0,
+                            help="parallel jobs, default is CPU count")
+
+    args = parser.parse_args(argv)
+    if args.command == 'convert':
+        return commandConvert(args)
+    if args.command == 'validate':
+        return commandValidate(args)
+    if args.command == 'thumbnails':
+        return commandThumbnails(args)
+    return commandStats(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -27,6 +27,10 @@ import os, glob, sys, pprint, re, json
 
 class Settings():
     defaultSettings = {"backupInterval": 10 * 60,
+                       "backupKeepAllInterval": 24 * 60 * 60,
+                       "backupKeepDays": 30,
+                       "componentLibraries": [],  # zip archives or directories, searched in order
+                       "componentReferences": True,
                        "lastProjectDir": ""}
     _settings = defaultSettings
 
@@ -46,7 +50,9 @@ class Settings():
         except:
             print("Bad settings data")
             return
-        Settings._settings = settings
+        # settings added in newer versions get default values
+        Settings._settings = dict(Settings.defaultSettings)
+        Settings._settings.update(settings)
 
 
     def data(self):
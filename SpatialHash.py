@@ -0,0 +1,116 @@
+"""
+ * Uniform grid spatial hash
+ *    Items are stored in every square cell their segment passes through,
+ *    widened by margin, so items near the point are found by looking
+ *    into cell of the point only.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import math
+
+
+class SpatialHash():
+    def __init__(self, cellSize):
+        self.cellSize = cellSize
+        self.clear()
+
+
+    def clear(self):
+        self._cells = {}  # (column, row): {item: None}
+        self._itemCells = {}  # item: list of cells
+
+
+    def cell(self, x, y):
+        return (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+
+
+    def segmentCells(self, x1, y1, x2, y2, margin=0):
+        # cells are walked along longer axis of segment
+        swapped = abs(y2 - y1) > abs(x2 - x1)
+        if swapped:
+            (x1, y1, x2, y2) = (y1, x1, y2, x2)
+        if x1 > x2:
+            (x1, y1, x2, y2) = (x2, y2, x1, y1)
+
+        size = self.cellSize
+        columns = range(math.floor((x1 - margin) / size),
+                        math.floor((x2 + margin) / size) + 1)
+        if y1 == y2:
+            rows = range(math.floor((y1 - margin) / size),
+                         math.floor((y1 + margin) / size) + 1)
+            if swapped:
+                return [(row, column) for column in columns for row in rows]
+            return [(column, row) for column in columns for row in rows]
+
+        slope = (y2 - y1) / (x2 - x1)
+        cells = []
+        for column in columns:
+            left = min(max(column * size, x1), x2)
+            right = max(min((column + 1) * size, x2), x1)
+            yLeft = y1 + (left - x1) * slope
+            yRight = y1 + (right - x1) * slope
+            for row in range(math.floor((min(yLeft, yRight) - margin) / size),
+                             math.floor((max(yLeft, yRight) + margin) / size) + 1):
+                if swapped:
+                    cells.append((row, column))
+                else:
+                    cells.append((column, row))
+        return cells
+
+
+    def insertSegment(self, item, x1, y1, x2, y2, margin=0):
+        self.remove(item)
+        cells = self.segmentCells(x1, y1, x2, y2, margin)
+        for cell in cells:
+            self._cells.setdefault(cell, {})[item] = None
+        self._itemCells[item] = cells
+
+
+    def remove(self, item):
+        cells = self._itemCells.pop(item, None)
+        if not cells:
+            return
+        for cell in cells:
+            items = self._cells[cell]
+            items.pop(item, None)
+            if not items:
+                del self._cells[cell]
+
+
+    def itemsAt(self, x, y):
+        return list(self._cells.get(self.cell(x, y), {}))
+
+
+    def cellItems(self, cell):
+        return list(self._cells.get(cell, {}))
+
+
+    def itemCells(self, item):
+        return self._itemCells.get(item, [])
+
+
+    def __contains__(self, item):
+        return item in self._itemCells
+
+
+    def __len__(self):
+        return len(self._itemCells)
@@ -0,0 +1,129 @@
+"""
+ * Component thumbnails loading
+ *    Thumbnails are decoded by QImageReader in worker thread in order
+ *    they were requested, requests which are not visible anymore are
+ *    dropped. Decoded pixmaps are kept in LRU cache of limited size.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+from PyQt5.QtCore import QObject, QBuffer, QByteArray, QIODevice, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+from collections import OrderedDict
+import threading
+import re
+
+
+class ThumbnailLoader(QObject):
+    loaded = pyqtSignal(str, QImage)  # key, decoded image
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = []
+        self._stopped = False
+
+
+    def request(self, sources):
+        # sources: list of (key, PNG data or file name),
+        # replaces all requests which are not decoded yet
+        with self._lock:
+            if self._stopped:
+                return
+            self._pending = list(sources)
+            if self._thread or not self._pending:
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name="ThumbnailLoader")
+            self._thread.daemon = True
+            self._thread.start()
+
+
+    def stop(self):
+        # drops not decoded requests and waits for decoding thread,
+        # nothing is decoded after that
+        with self._lock:
+            self._stopped = True
+            self._pending = []
+            thread = self._thread
+        if thread:
+            thread.join()
+
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                (key, source) = self._pending.pop(0)
+
+            image = self._read(source)
+            if image.isNull():
+                print("can't decode thumbnail %s" % key)
+            with self._lock:
+                if self._stopped:
+                    self._thread = None
+                    return
+            self.loaded.emit(key, image)
+
+
+    def _read(self, source):
+        if isinstance(source, str):
+            image = QImageReader(source).read()
+            match = re.search(r'@(\d)x\.png$', source)
+            if match:
+                image.setDevicePixelRatio(int(match.group(1)))
+            return image
+        buffer = QBuffer()
+        buffer.setData(QByteArray(source))
+        buffer.open(QIODevice.ReadOnly)
+        reader = QImageReader(buffer, b'png')
+        return reader.read()
+
+
+
+class PixmapCache():
+    def __init__(self, size):
+        self._size = size
+        self._pixmaps = OrderedDict()
+
+
+    def get(self, key):
+        if key not in self._pixmaps:
+            return None
+        self._pixmaps.move_to_end(key)
+        return self._pixmaps[key]
+
+
+    def put(self, key, pixmap):
+        # returns keys of evicted pixmaps
+        self._pixmaps[key] = pixmap
+        self._pixmaps.move_to_end(key)
+        evicted = []
+        while len(self._pixmaps) > self._size:
+            evicted.append(self._pixmaps.popitem(last=False)[0])
+        return evicted
+
+
+    def remove(self, key):
+        self._pixmaps.pop(key, None)
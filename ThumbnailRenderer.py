@@ -0,0 +1,193 @@
+"""
+ * Component thumbnails rendering
+ *    Thumbnail is rendered from component properties into QImage for
+ *    each of THUMBNAIL_SCALES, scale 2 is saved as '<name>@2x.png' for
+ *    HiDPI screens. Editor renders in worker thread, all thumbnails of
+ *    components directory are regenerated by a process pool.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+from PyQt5.QtCore import QObject, QThread, QBuffer, QIODevice, QPointF, QRectF, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QGraphicsScene
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import os, glob, json
+import ProjectFile
+
+
+THUMBNAIL_WIDTH = 100
+THUMBNAIL_MAX_HEIGHT = 80
+THUMBNAIL_SCALES = [1, 2]
+
+
+def thumbnailFileName(baseName, scale):
+    if scale == 1:
+        return "%s.png" % baseName
+    return "%s@%dx.png" % (baseName, scale)
+
+
+def renderThumbnails(groupProperties):
+    # returns {scale: QImage}, doesn't touch GUI objects
+    # so it may be called in worker thread
+    import ElectroEditor
+    from GraphicsItem import createGraphicsObjectByProperties, mapToGrid, MAX_GRID_SIZE
+
+    # ids of component items are kept and group id is zero,
+    # so new ids are not taken from editor
+    groupProperties = dict(groupProperties)
+    groupProperties['id'] = 0
+    group = createGraphicsObjectByProperties(groupProperties, True)
+    rect = mapToGrid(group.boundingRect(), MAX_GRID_SIZE)
+    rect = QRectF(0, 0,
+                  rect.width() + MAX_GRID_SIZE * 2,
+                  rect.height() + MAX_GRID_SIZE * 2)
+    tempScene = QGraphicsScene()
+    tempScene.setSceneRect(rect)
+    group.setIndex(0)
+    group.setPos(QPointF(MAX_GRID_SIZE, MAX_GRID_SIZE))
+    group.setScene(tempScene)
+
+    images = {}
+    for scale in THUMBNAIL_SCALES:
+        image = QImage((rect.size() * scale).toSize(), QImage.Format_ARGB32)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        tempScene.render(painter, QRectF(image.rect()), rect)
+        painter.end()
+
+        image = image.scaledToWidth(THUMBNAIL_WIDTH * scale, Qt.SmoothTransformation)
+        if image.height() > THUMBNAIL_MAX_HEIGHT * scale:
+            image = image.scaledToHeight(THUMBNAIL_WIDTH * scale, Qt.SmoothTransformation)
+        images[scale] = image
+    return images
+
+
+def imagePngData(image):
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+
+def saveThumbnails(baseName, groupProperties):
+    # files are replaced atomically, so library watcher sees them
+    # only when they are complete
+    images = renderThumbnails(groupProperties)
+    for scale in images:
+        ProjectFile.writeFileAtomic(thumbnailFileName(baseName, scale),
+                                    imagePngData(images[scale]))
+
+
+
+class RenderThread(QThread):
+    # QGraphicsScene needs thread started by QThread
+    def __init__(self, renderer):
+        QThread.__init__(self)
+        self._renderer = renderer
+
+
+    def run(self):
+        self._renderer._run()
+
+
+
+class ThumbnailRenderer(QObject):
+    finished = pyqtSignal(str, str)  # component name, error message or ""
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._pending = []
+
+
+    def render(self, name, baseName, groupProperties):
+        # groupProperties must not be changed until finished
+        with self._lock:
+            self._pending.append((name, baseName, groupProperties))
+            if self._running:
+                return
+            self._running = True
+
+        # previous thread has nothing to do and is finishing
+        if self._thread:
+            self._thread.wait()
+        self._thread = RenderThread(self)
+        self._thread.start()
+
+
+    def wait(self):
+        if self._thread:
+            self._thread.wait()
+
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                (name, baseName, groupProperties) = self._pending.pop(0)
+
+            error = ""
+            try:
+                saveThumbnails(baseName, groupProperties)
+            except Exception as e:
+                error = str(e)
+            self.finished.emit(name, error)
+
+
+
+workerApp = None
+
+def initWorker():
+    # each worker process has own offscreen application
+    global workerApp
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    from PyQt5.QtWidgets import QApplication
+    workerApp = QApplication([])
+
+
+def regenerateFile(fileName):
+    try:
+        with open(fileName, "r") as file:
+            properties = json.loads(file.read())
+        saveThumbnails(os.path.splitext(fileName)[0], properties)
+    except Exception as e:
+        return (fileName, str(e))
+    return (fileName, None)
+
+
+def regenerateThumbnails(dirName, jobs=0):
+    # returns count of failed components
+    fileNames = sorted(glob.glob("%s/*.ec" % dirName))
+    pool = ProcessPoolExecutor(jobs or None, initializer=initWorker)
+    failed = 0
+    for (fileName, error) in pool.map(regenerateFile, fileNames, chunksize=8):
+        if error:
+            failed += 1
+            print("%s: %s" % (fileName, error))
+    pool.shutdown()
+    print("%d thumbnails regenerated, %d failed" % (len(fileNames) - failed, failed))
+    return failed
@@ -0,0 +1,68 @@
+"""
+ * Benchmark of library component placement rate
+ *    Usage: python3 benchmarks/ComponentPlacementBenchmark.py [component ...]
+ *    Compares creating group from component properties with creating it
+ *    from parsed component template. Without arguments 'bus', 'terminal'
+ *    and 'optron_2' components are used.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, sys, io, time, contextlib
+from SyntheticProject import *
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from ElectroEditor import *
+
+
+def placementRate(create, duration=1.0):
+    # item creation messages are not printed while measuring
+    count = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        while True:
+            create()
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                break
+    return count / elapsed
+
+
+def itemsCount(properties):
+    count = 1
+    for itemProperties in properties.get('graphicsObjects', []):
+        count += itemsCount(itemProperties)
+    return count
+
+
+components = libraryComponents()
+names = sys.argv[1:] or ['bus', 'terminal', 'optron_2']
+for name in names:
+    properties = components[name]
+    template = componentTemplate(properties)
+    propertiesRate = placementRate(lambda: createGraphicsObjectByProperties(properties))
+    templateRate = placementRate(lambda: createGraphicsObjectByProperties(template,
+                                                                          template=True))
+    print("%-10s %4d items  properties: %8.0f/s  template: %8.0f/s  (x%.2f)" % (
+          name, itemsCount(properties), propertiesRate, templateRate,
+          templateRate / propertiesRate))
@@ -0,0 +1,154 @@
+"""
+ * Benchmark of junction points detection on dense trace pages
+ *    Usage: python3 benchmarks/JunctionBenchmark.py [segments ...]
+ *    Page is a mesh of trace segments with cross and T junctions.
+ *    Measured are building junctions of whole page, updating them after
+ *    one line is moved and scanning all scene lines for each line tip.
+ *    The scan is measured on small pages only because of its quadratic
+ *    time, its result is compared with maintained junctions.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, sys, io, time, contextlib
+from SyntheticProject import *
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from ElectroEditor import *
+
+SCAN_MAX_SEGMENTS = 2000  # larger pages are not measured with scanning
+
+
+def meshItemsData(segmentsCount):
+    # horizontal traces are two cells long, vertical traces start on each
+    # cell, so odd vertical traces make T junctions with horizontal ones
+    cell = MAX_GRID_SIZE * 2
+    size = max(2, int((segmentsCount / 1.5) ** 0.5) // 2 * 2)
+    itemsData = []
+    id = 1
+    for row in range(size):
+        for column in range(size):
+            x = column * cell
+            y = row * cell
+            if column % 2 == 0:
+                itemsData.append(traceLine(id, x, y, cell * 2, 0))
+                id += 1
+            itemsData.append(traceLine(id, x, y, 0, cell))
+            id += 1
+    return itemsData
+
+
+def scanJunctions(scene):
+    # each line tip is tested against all lines of scene
+    items = scene.graphicsItems()
+    listPoints = {}
+    for item in items:
+        if item.type() != LINE_TYPE:
+            continue
+        for itemP in item.points():
+            pointStr = "%dx%d" % (itemP.x(), itemP.y())
+            if pointStr in listPoints:
+                listPoints[pointStr]['cnt'] += 1
+            else:
+                listPoints[pointStr] = {'cnt': 1,
+                                        'point': itemP,
+                                        'item': item,
+                                        'tracePoint': False}
+            if item.typeLine() == 'trace':
+                listPoints[pointStr]['tracePoint'] = True
+
+    showPoints = set()
+    for data in listPoints.values():
+        if data['cnt'] > 2 and data['tracePoint']:
+            showPoints.add((data['point'].x(), data['point'].y()))
+            continue
+        for item in scene.graphicsUnpackedItems():
+            if item.type() != LINE_TYPE or item.typeLine() != 'trace':
+                continue
+            if item == data['item']:
+                continue
+            if not item.contains(data['point'] - item.pos()):
+                continue
+            if data['point'] in item.points():
+                continue
+            showPoints.add((data['point'].x(), data['point'].y()))
+    return showPoints
+
+
+def shownJunctions(scene):
+    points = set()
+    for pointEllipse in scene.interceptionPoints.values():
+        if pointEllipse.isVisible():
+            pos = pointEllipse.pos() + QPointF(3, 3)
+            points.add((pos.x(), pos.y()))
+    return points
+
+
+def measure(func, repeat=3):
+    best = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    return best
+
+
+# editor files are looked up near started script
+sys.argv[0] = "%s/electro.py" % editorDir
+with contextlib.redirect_stdout(io.StringIO()):
+    editor = ElectroEditor(app)
+sizes = [int(arg) for arg in sys.argv[1:]] or [500, 2000, 5000, 10000]
+for segmentsCount in sizes:
+    with contextlib.redirect_stdout(io.StringIO()):
+        page = PageWidget(editor)
+        scene = page.scene()
+        for properties in meshItemsData(segmentsCount):
+            scene.addGraphicsItem(createGraphicsObjectByProperties(properties, True))
+
+    lines = scene.graphicsItems(LINE_TYPE)
+    buildTime = measure(scene.intersectionPointsShow, repeat=1)
+
+    # line in the middle of page is moved by one cell and back
+    line = lines[len(lines) // 2]
+    moves = [QPointF(MAX_GRID_SIZE * 2, 0), QPointF(-MAX_GRID_SIZE * 2, 0)]
+    def moveLine():
+        for delta in moves:
+            line.setPos(line.pos() + delta)
+            scene.intersectionPointsShow()
+    moveTime = measure(moveLine, repeat=10) / len(moves)
+
+    junctions = shownJunctions(scene)
+    result = "%6d segments %5d junctions  build: %7.1f ms  line move: %6.2f ms" % (
+             len(lines), len(junctions), buildTime * 1000, moveTime * 1000)
+    if len(lines) <= SCAN_MAX_SEGMENTS:
+        scanTime = measure(lambda: scanJunctions(scene), repeat=1)
+        result += "  scan: %9.1f ms" % (scanTime * 1000)
+        if scanJunctions(scene) != junctions:
+            result += "  DIFFERENT JUNCTIONS"
+    print(result)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        scene.removeGraphicsItems(scene.graphicsItems())
+        scene.intersectionPointsShow()
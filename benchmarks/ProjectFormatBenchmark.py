@@ -0,0 +1,85 @@
+"""
+ * Benchmark of project open/save time and file size for '.es' and '.esb'
+ *    Usage: python3 benchmarks/ProjectFormatBenchmark.py [project.es ...]
+ *    Without arguments synthetic projects of several sizes are used.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, sys, time, tempfile
+from SyntheticProject import *
+import ProjectFile
+import ComponentReferences
+
+
+def bestTime(func, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def benchmarkProject(title, project, templates):
+    tempDir = tempfile.mkdtemp()
+    print("%s:" % title)
+    for references in [False, True]:
+        for format in ProjectFile.PROJECT_EXTENSIONS:
+            fileName = "%s/project%s" % (tempDir, format)
+
+            def save():
+                data = project
+                if references:
+                    data = ComponentReferences.packProject(project, templates)
+                ProjectFile.saveProject(fileName, data)
+
+            def load():
+                data = ProjectFile.loadProject(fileName)
+                ComponentReferences.expandProject(data)
+                return data
+
+            saveTime = bestTime(save)
+            openTime = bestTime(load)
+            size = os.path.getsize(fileName)
+            if load() != project:
+                print("  %s: ROUND TRIP FAILED" % format)
+            if references:
+                format += " refs"
+            print("  %-11s size: %9.1f KiB  save: %7.1f ms  open: %7.1f ms" % (
+                  format, size / 1024.0, saveTime * 1000, openTime * 1000))
+            os.remove(fileName)
+    os.rmdir(tempDir)
+
+
+templates = libraryComponents()
+if len(sys.argv) > 1:
+    for fileName in sys.argv[1:]:
+        project = ProjectFile.loadProject(fileName)
+        ComponentReferences.expandProject(project)
+        benchmarkProject(fileName, project, templates)
+else:
+    for pagesCount in [10, 40]:
+        project = generateProject(pagesCount=pagesCount)
+        benchmarkProject("synthetic project, %d pages x (200 components + "
+                         "1000 traces)" % pagesCount, project, templates)
@@ -0,0 +1,134 @@
+"""
+ * Synthetic project generator for benchmarks
+ *    Builds large projects as properties dicts from library components
+ *    and trace lines without creating any Qt objects.
+ *
+ * Copyright (c) 2018 Michail Kurochkin
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ """
+
+import os, sys, glob, json, copy, random
+
+benchmarksDir = os.path.dirname(os.path.realpath(__file__))
+editorDir = os.path.dirname(benchmarksDir)
+sys.path.insert(0, editorDir)
+
+MAX_GRID_SIZE = 20
+
+
+def libraryComponents():
+    components = {}
+    for fileName in sorted(glob.glob("%s/components/*.ec" % editorDir)):
+        name = os.path.splitext(os.path.basename(fileName))[0]
+        file = open(fileName, "r")
+        components[name] = json.loads(file.read())
+        file.close()
+    return components
+
+
+def traceLine(id, x, y, dx, dy):
+    return {"id": id,
+            "type": "line",
+            "typeLine": "trace",
+            "name": "",
+            "mountPoint": {"x": float(x), "y": float(y)},
+            "p1": {"x": 0.0, "y": 0.0},
+            "p2": {"x": float(dx), "y": float(dy)},
+            "penStyle": "solid",
+            "thickness": 2,
+            "zIndex": 2}
+
+
+def linkPoint(id, x, y):
+    return {"id": id,
+            "type": "link",
+            "name": "",
+            "mountPoint": {"x": float(x), "y": float(y)},
+            "arrowPoint": {"x": float(MAX_GRID_SIZE), "y": 0.0},
+            "color": {"R": 0, "G": 0, "B": 200},
+            "penStyle": "solid",
+            "thickness": 2,
+            "zIndex": None}
+
+
+def generateProject(pagesCount=40, componentsPerPage=200, tracesPerPage=1000,
+                    linksPerPage=10, seed=1):
+    rand = random.Random(seed)
+    components = libraryComponents()
+    names = sorted(components)
+    lastId = 0
+    indexes = {}
+    pages = []
+    links = []
+
+    for pageNum in range(1, pagesCount + 1):
+        items = []
+        for i in range(componentsPerPage):
+            lastId += 1
+            name = rand.choice(names)
+            group = copy.deepcopy(components[name])
+            group['id'] = lastId
+            group['component'] = name
+            group['mountPoint'] = {"x": float(rand.randrange(0, 80) * MAX_GRID_SIZE),
+                                   "y": float(rand.randrange(0, 60) * MAX_GRID_SIZE)}
+            if group.get('prefixName'):
+                prefix = group['prefixName']
+                indexes[prefix] = indexes.get(prefix, 0) + 1
+                group['index'] = indexes[prefix]
+            items.append(group)
+
+        for i in range(tracesPerPage):
+            lastId += 1
+            x = rand.randrange(0, 80) * MAX_GRID_SIZE
+            y = rand.randrange(0, 60) * MAX_GRID_SIZE
+            length = rand.randrange(1, 10) * MAX_GRID_SIZE
+            if rand.random() < 0.5:
+                items.append(traceLine(lastId, x, y, length, 0))
+            else:
+                items.append(traceLine(lastId, x, y, 0, length))
+
+        for i in range(linksPerPage):
+            lastId += 1
+            items.append(linkPoint(lastId,
+                                   rand.randrange(0, 80) * MAX_GRID_SIZE,
+                                   rand.randrange(0, 60) * MAX_GRID_SIZE))
+            links.append(lastId)
+
+        pages.append({"num": pageNum,
+                      "name": "page %d" % pageNum,
+                      "items": items})
+
+    rand.shuffle(links)
+    connections = []
+    for i in range(0, len(links) - 1, 2):
+        connections.append({"id": len(connections) + 1,
+                            "p1": links[i],
+                            "p2": links[i + 1]})
+
+    header = {"app": "Electro Schematic editor",
+              "version": 1,
+              "viewPage": 1,
+              "viewCenter": {"x": 800.0, "y": 600.0},
+              "viewZoom": 100,
+              "rev": 1,
+              "date": "01.01.2018"}
+    return {"header": header,
+            "pages": pages,
+            "connections": connections}
@@ -5,6 +5,8 @@
  * Main executable file of editor.
  *     option '-i' provide python console after run editor.
  *     Example: python3 -i electro.py -i
+ *     commands convert, validate and stats run without GUI,
+ *     see ProjectTool.py. Example: python3 electro.py validate *.es
  *
  * Copyright (c) 2018 Michail Kurochkin
  *
@@ -27,8 +29,14 @@
  * THE SOFTWARE.
  """
 
-import rlcompleter, readline
 import sys
+import ProjectTool
+
+# headless commands don't load Qt
+if len(sys.argv) > 1 and sys.argv[1] in ProjectTool.COMMANDS:
+    sys.exit(ProjectTool.main(sys.argv[1:]))
+
+import rlcompleter, readline
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from ElectroEditor import *